@@ -0,0 +1,276 @@
+"""
+Реестр анализаторов выгрузки Splunk по sourcetype.
+
+Каждый анализатор объявляет, к каким sourcetype он относится (подстроки,
+как прежний str.contains), какие поля ему нужны, и копит свои счётчики
+по порциям в update(). Распределение записей делает dispatch_chunk: для
+каждой категории sourcetype набор анализаторов находится один раз, дальше
+строки раскладываются по кодам категорий за один проход — добавление нового
+источника не добавляет ещё одного сканирования sourcetype. Запись получает
+каждый подходящий анализатор: Sysmon (XmlWinEventLog:...Sysmon...) по-прежнему
+учитывается и в WinEventLog, как в исходном str.contains.
+"""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+ANALYZERS = []
+# Время (и его части на случай выгрузки без _time) и sourcetype нужны всегда.
+BASE_FIELDS = ['_time', 'sourcetype', 'date_year', 'date_month', 'date_mday', 'date_hour', 'date_minute', 'date_second']
+TOP = 10
+
+# Список подозрительных EventID (на основе известных индикаторов компрометации)
+# Источник: https://www.ultimatewindowssecurity.com/securitylog/encyclopedia/
+SUSPICIOUS_EVENTIDS = [
+    4624, 4625, 4648, 4672, 4688, 4703, 4719, 4720, 4732, 4768, 4769,
+    4776, 4798, 4799, 4800, 4801, 4802, 4803, 5379, 5382, 4656, 4689
+]
+
+
+def register(cls):
+    ANALYZERS.append(cls)
+    return cls
+
+
+def count_values(counter, series):
+    """Добавляет в Counter частоты значений колонки (без пропусков)."""
+    counts = series.value_counts(sort=False)
+    for value, count in counts[counts > 0].items():
+        counter[value] += int(count)
+
+
+def top_frame(counter, columns, top=TOP):
+    return pd.DataFrame(counter.most_common(top), columns=columns)
+
+
+def print_top(title, frame):
+    print(f"\n{title}")
+    print(frame)
+
+
+def save_barplot(frame, x, title, xlabel, filename, palette):
+    plt.figure(figsize=(12, 6))
+    sns.barplot(data=frame, x=x, y='Count', palette=palette)
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel('Количество')
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(filename)
+    plt.show()
+
+
+class Analyzer:
+    name = ""
+    sourcetypes = ()  # подстроки sourcetype
+    fields = ()  # поля result, которые нужны update()
+
+    def __init__(self):
+        self.records = 0
+
+    def matches(self, sourcetype):
+        return any(pattern in sourcetype for pattern in self.sourcetypes)
+
+    def update(self, part):
+        """part — строки порции, относящиеся к этому анализатору."""
+        self.records += len(part)
+
+    def report(self):
+        pass
+
+    def plot(self):
+        pass
+
+
+@register
+class SysmonAnalyzer(Analyzer):
+    name = "Sysmon"
+    sourcetypes = ("Sysmon",)
+    fields = ('EventCode', 'Image')
+
+    def __init__(self):
+        super().__init__()
+        self.event_codes = Counter()
+        self.images = Counter()
+
+    def update(self, part):
+        super().update(part)
+        count_values(self.event_codes, part['EventCode'])
+        count_values(self.images, part['Image'])
+
+    def report(self):
+        if self.records:
+            print_top("События Sysmon по EventID:", top_frame(self.event_codes, ['EventCode', 'Count']))
+            print_top("Топ-10 процессов Sysmon (Image):", top_frame(self.images, ['Image', 'Count']))
+
+
+@register
+class WinEventLogAnalyzer(Analyzer):
+    name = "WinEventLog"
+    sourcetypes = ("WinEventLog",)
+    fields = ('EventCode',)
+
+    def __init__(self):
+        super().__init__()
+        self.event_codes = Counter()
+        self.top10_suspicious = None
+
+    def update(self, part):
+        super().update(part)
+        count_values(self.event_codes, part['EventCode'])
+
+    def report(self):
+        suspicious_eventids = list(SUSPICIOUS_EVENTIDS)
+
+        # Добавим EventID из наших данных, если их нет в списке (для демонстрации)
+        for eid in self.event_codes:
+            if eid not in suspicious_eventids:
+                suspicious_eventids.append(int(eid))
+
+        # Подсчёт частоты подозрительных событий; берём топ-10
+        suspicious_counts = pd.DataFrame(
+            [(eid, count) for eid, count in self.event_codes.most_common() if eid in suspicious_eventids],
+            columns=['EventCode', 'Count'],
+        )
+        self.top10_suspicious = suspicious_counts.head(TOP)
+        print_top("Топ-10 подозрительных событий WinEventLog:", self.top10_suspicious)
+
+    def plot(self):
+        if self.top10_suspicious is not None and not self.top10_suspicious.empty:
+            save_barplot(
+                self.top10_suspicious, 'EventCode', 'Топ-10 подозрительных событий WinEventLog по EventID',
+                'Event ID', 'top10_suspicious_winevent.png', 'viridis',
+            )
+
+
+@register
+class DnsAnalyzer(Analyzer):
+    name = "DNS"
+    sourcetypes = ("stream:dns", "DNS")
+    fields = ('query',)
+
+    def __init__(self):
+        super().__init__()
+        self.queries = Counter()
+        self.dns_suspicious = None
+
+    def update(self, part):
+        super().update(part)
+        count_values(self.queries, part['query'])
+
+    def report(self):
+        if not self.queries:
+            print("\nDNS-логи отсутствуют в предоставленном файле.")
+            return
+        # Здесь можно реализовать логику поиска подозрительных DNS-запросов
+        # Например, частые запросы к редким доменам, длинные поддомены и т.д.
+        # Для демонстрации просто посчитаем топ-10 доменов
+        self.dns_suspicious = top_frame(self.queries, ['Domain', 'Count'])
+        print_top("Топ-10 DNS-запросов (потенциально подозрительные):", self.dns_suspicious)
+
+    def plot(self):
+        if self.dns_suspicious is not None:
+            save_barplot(self.dns_suspicious, 'Domain', 'Топ-10 DNS-запросов', 'Домен', 'top10_dns.png', 'magma')
+
+
+@register
+class HttpAnalyzer(Analyzer):
+    name = "stream:http"
+    sourcetypes = ("stream:http",)
+    fields = ('site', 'http_method', 'status')
+
+    def __init__(self):
+        super().__init__()
+        self.sites = Counter()
+        self.methods = Counter()
+        self.statuses = Counter()
+
+    def update(self, part):
+        super().update(part)
+        count_values(self.sites, part['site'])
+        count_values(self.methods, part['http_method'])
+        count_values(self.statuses, part['status'])
+
+    def report(self):
+        if self.records:
+            print_top("Топ-10 сайтов stream:http:", top_frame(self.sites, ['Site', 'Count']))
+            print_top("HTTP-методы:", top_frame(self.methods, ['Method', 'Count']))
+            print_top("Коды ответа HTTP:", top_frame(self.statuses, ['Status', 'Count']))
+
+
+@register
+class SuricataAnalyzer(Analyzer):
+    name = "Suricata"
+    sourcetypes = ("suricata",)
+    fields = ('alert.signature',)
+
+    def __init__(self):
+        super().__init__()
+        self.signatures = Counter()
+
+    def update(self, part):
+        super().update(part)
+        count_values(self.signatures, part['alert.signature'])
+
+    def report(self):
+        if self.signatures:
+            print_top("Топ-10 сигнатур Suricata:", top_frame(self.signatures, ['Signature', 'Count']))
+
+
+def create_analyzers(names=None):
+    """Экземпляры зарегистрированных анализаторов (все или только перечисленные по name)."""
+    if names is None:
+        return [cls() for cls in ANALYZERS]
+    known = {cls.name: cls for cls in ANALYZERS}
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Неизвестные анализаторы: {', '.join(unknown)} (есть: {', '.join(known)})")
+    return [cls() for cls in ANALYZERS if cls.name in names]
+
+
+def analyzer_fields(analyzers):
+    """Поля, которые нужно сохранить из выгрузки для выбранных анализаторов."""
+    fields = list(BASE_FIELDS)
+    for analyzer in analyzers:
+        fields.extend(field for field in analyzer.fields if field not in fields)
+    return fields
+
+
+class Dispatcher:
+    """Раскладывает порции по анализаторам по кодам категорий sourcetype."""
+
+    def __init__(self, analyzers):
+        self.analyzers = analyzers
+        self.unmatched = Counter()
+        self._routes = {}  # sourcetype -> индексы подходящих анализаторов
+
+    def route(self, sourcetype):
+        if sourcetype not in self._routes:
+            self._routes[sourcetype] = tuple(
+                index for index, analyzer in enumerate(self.analyzers) if analyzer.matches(sourcetype)
+            )
+        return self._routes[sourcetype]
+
+    def dispatch_chunk(self, chunk):
+        sourcetypes = chunk['sourcetype']
+        if not isinstance(sourcetypes.dtype, pd.CategoricalDtype):
+            sourcetypes = sourcetypes.astype('category')
+        categories = sourcetypes.cat.categories
+        # Набор анализаторов ищется один раз на категорию, одинаковые наборы
+        # получают общий номер; код -1 (нет sourcetype) -> пустой набор.
+        route_ids = {}
+        codes = [route_ids.setdefault(self.route(sourcetype), len(route_ids)) for sourcetype in categories]
+        codes.append(route_ids.setdefault((), len(route_ids)))
+        targets = np.array(codes, dtype=np.int64)[sourcetypes.cat.codes.to_numpy()]
+        routes = list(route_ids)
+
+        for route_id, part in chunk.groupby(targets, sort=False):
+            route = routes[route_id]
+            for index in route:
+                self.analyzers[index].update(part)
+            if not route:
+                count_values(self.unmatched, part['sourcetype'].astype(object).fillna('<нет sourcetype>'))
@@ -0,0 +1,167 @@
+"""
+Потоковое чтение выгрузки Splunk (botsv1.json и аналогичных).
+
+Выгрузка — JSON-массив (или NDJSON) объектов вида
+{"preview": ..., "offset": ..., "result": {...}}. Файл читается кусками
+по READ_SIZE символов, объекты разбираются по одному через
+json.JSONDecoder.raw_decode, из каждого result сразу берутся только
+нужные поля. Из отобранных записей собираются DataFrame по chunk_rows
+строк с заданными типами, так что память ограничена размером порции,
+а не размером выгрузки.
+"""
+
+import json
+import re
+
+import pandas as pd
+
+READ_SIZE = 1024 * 1024
+CHUNK_ROWS = 50_000
+
+# Поля, нужные анализу; остальные (Message, _raw, body и т.п.) не сохраняются.
+DEFAULT_FIELDS = [
+    '_time', 'sourcetype', 'source', 'host', 'EventCode', 'LogName',
+    'ComputerName', 'Account_Name', 'Account_Domain', 'query',
+    'date_year', 'date_month', 'date_mday', 'date_hour', 'date_minute', 'date_second',
+]
+FIELD_TYPES = {
+    'EventCode': 'Int32',
+    'sourcetype': 'category',
+    'source': 'category',
+    'host': 'category',
+    'LogName': 'category',
+    'ComputerName': 'category',
+}
+# _time в выгрузке: '2016-08-28 16:02:21.000 MDT'; сокращение зоны
+# pandas не понимает, поэтому время берётся без него (как в индексе Splunk).
+SPLUNK_TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+SPLUNK_TIME_LENGTH = 23
+LIST_SEPARATOR = ', '
+
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4,
+    'may': 5, 'june': 6, 'july': 7, 'august': 8,
+    'september': 9, 'october': 10, 'november': 11, 'december': 12
+}
+
+DATE_FIELDS = ['date_year', 'date_month', 'date_mday', 'date_hour', 'date_minute', 'date_second']
+
+# Между объектами верхнего уровня: пробелы, запятые и скобки массива.
+SEPARATORS = re.compile(r"[\s,\[\]]*")
+
+
+def iter_json_objects(f, read_size=READ_SIZE):
+    """Объекты верхнего уровня JSON-массива или NDJSON по одному."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                return
+            buffer = f.read(read_size)
+            pos = 0
+            eof = not buffer
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Объект оборвался на границе куска — дочитываем и пробуем ещё раз.
+            if eof:
+                raise
+            chunk = f.read(read_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield value
+        pos = end
+
+
+def iter_results(path, fields=None):
+    """Поля result из каждой записи выгрузки; fields=None — все поля."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for item in iter_json_objects(f):
+            result = item.get('result') if isinstance(item, dict) else None
+            if result is None:
+                continue  # служебные сообщения экспорта (lastrow, messages)
+            if fields is None:
+                yield result
+            else:
+                yield {field: result[field] for field in fields if field in result}
+
+
+def add_timestamp(df):
+    """Единая временная метка: из _time или, если его нет, из полей date_*."""
+    if '_time' in df.columns and df['_time'].notna().any():
+        df['timestamp'] = pd.to_datetime(
+            df['_time'].str.slice(0, SPLUNK_TIME_LENGTH),
+            format=SPLUNK_TIME_FORMAT,
+            errors='coerce',
+        )
+    elif all(col in df.columns for col in DATE_FIELDS):
+        df['timestamp'] = pd.to_datetime(
+            df['date_year'].astype(str) + '-' +
+            df['date_month'].map(MONTHS).astype(str) + '-' +
+            df['date_mday'].astype(str) + ' ' +
+            df['date_hour'].astype(str) + ':' +
+            df['date_minute'].astype(str) + ':' +
+            df['date_second'].astype(str),
+            errors='coerce'
+        )
+    else:
+        df['timestamp'] = pd.NaT
+    return df
+
+
+def join_list_column(series, sep=LIST_SEPARATOR):
+    """Списки -> строка через sep; остальные значения колонки не меняются."""
+    is_list = series.map(type).eq(list)
+    lists = series[is_list]
+    joined = lists.str.join(sep)
+    # str.join даёт NaN, если в списке есть не-строки; такие списки склеиваем поштучно.
+    odd = joined.isna()
+    if odd.any():
+        joined[odd] = lists[odd].map(lambda items: sep.join(map(str, items)))
+    result = series.copy()
+    result[is_list] = joined
+    return result
+
+
+def build_chunk(rows, fields, list_fields=()):
+    """DataFrame из отобранных записей; list_fields — поля, где встречались списки."""
+    df = pd.DataFrame.from_records(rows, columns=fields)
+
+    # Многозначные поля Splunk склеиваем в строку через запятую — только те
+    # колонки, где при разборе действительно попались списки.
+    for col in list_fields:
+        df[col] = join_list_column(df[col])
+
+    for col, dtype in FIELD_TYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = df[col].astype('category')
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+    return add_timestamp(df)
+
+
+def iter_result_chunks(path, fields=DEFAULT_FIELDS, chunk_rows=CHUNK_ROWS):
+    """DataFrame по chunk_rows записей с колонками fields (+ timestamp)."""
+    rows = []
+    list_fields = set()
+    for result in iter_results(path, fields):
+        rows.append(result)
+        # Списки ищем сразу при разборе: одна проверка типов на запись
+        # вместо проходов по каждой колонке готового DataFrame.
+        if list in map(type, result.values()):
+            list_fields.update(field for field, value in result.items() if type(value) is list)
+        if len(rows) >= chunk_rows:
+            yield build_chunk(rows, fields, list_fields)
+            rows = []
+            list_fields = set()
+    if rows:
+        yield build_chunk(rows, fields, list_fields)
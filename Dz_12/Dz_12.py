@@ -1,20 +1,39 @@
-import pyshark
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import json
+import argparse
 import os
 import asyncio
 
+from dns_analytics import REPORT_TOP, domain_stats, print_domain_report
+from dns_store import DnsRecordStore
+from dns_timeline import DEFAULT_RESOLUTIONS, parse_resolution, parse_resolutions, resolution_label
+from dns_writers import DEFAULT_BUFFER_ROWS, DnsStreamWriter, ndjson_to_json
+from pcap_dns import extract_dns_native
+
+try:
+    import pyshark
+except ImportError:  # встроенному разборщику pyshark и tshark не нужны
+    pyshark = None
+
 # ==========================
 #  Конфигурация
 # ==========================
 PCAP_FILE = "dhcp.pcapng"
 TSHARK_PATH = r"C:\Users\rust0\Desktop\WiresharkPortable64\App\Wireshark\tshark.exe"  # <-- Укажите ваш путь
 OUTPUT_CSV = "dns_requests.csv"
+OUTPUT_NDJSON = "dns_requests.ndjson"
+# Прежний вывод одним JSON-массивом — только по флагу --json.
 OUTPUT_JSON = "dns_requests.json"
 PLOT_FILE = "dns_timeline.png"
+TIMESERIES_CSV = "dns_timeseries.csv"
+# Разрешения счётчиков по времени и то, по которому строится график.
+TIMELINE_RESOLUTIONS = "1s,1min,1h"
+PLOT_RESOLUTION = 60
+DOMAIN_STATS_CSV = "dns_domains.csv"
 UNIQUE_IPS_FILE = "unique_ips.txt"
+# pyshark — через tshark (как раньше); native — встроенный разборщик
+# pcap/pcapng (pcap_dns.py), включается флагом --backend native
+BACKEND = "pyshark"
 
 # ==========================
 #  Создание цикла событий asyncio
@@ -30,17 +49,29 @@ def ensure_event_loop():
 # ==========================
 #  Чтение дампа и извлечение DNS-запросов
 # ==========================
-def extract_dns_requests(pcap_file, tshark_path=None):
+def extract_dns_requests(pcap_file, tshark_path=None, resolutions=DEFAULT_RESOLUTIONS, display_filter=None):
     """
     Открывает pcap-файл, используя указанный путь к tshark (если задан),
-    собирает DNS-запросы и все IP-адреса.
+    собирает DNS-запросы (в DnsRecordStore) и все IP-адреса.
+    display_filter передаётся в tshark: пакеты, не прошедшие фильтр,
+    pyshark вообще не получает (и их IP в all_ips не попадают).
     """
-    dns_records = []
+    if pyshark is None:
+        raise RuntimeError("pyshark не установлен: pip install pyshark или --backend native")
+
+    dns_records = DnsRecordStore(resolutions)
     all_ips = set()
 
     print(f"[*] Открываем файл: {pcap_file}")
     # Передаём tshark_path, если он указан
-    cap = pyshark.FileCapture(pcap_file, keep_packets=False, tshark_path=tshark_path)
+    if display_filter:
+        print(f"[*] Фильтр tshark: {display_filter}")
+    cap = pyshark.FileCapture(
+        pcap_file,
+        keep_packets=False,
+        tshark_path=tshark_path,
+        display_filter=display_filter,
+    )
 
     packet_count = 0
     try:
@@ -65,15 +96,18 @@ def extract_dns_requests(pcap_file, tshark_path=None):
                         timestamp = packet.sniff_time
                     except AttributeError:
                         timestamp = None
+                    # Для ответов сохраняем rcode (3 — NXDOMAIN); в разных версиях
+                    # tshark флаг QR приходит как '1' или 'True'.
+                    is_response = str(dns_layer.get('flags_response', '0')) in ('1', 'True', 'true')
 
-                    record = {
-                        'time': timestamp,
-                        'src_ip': packet.ip.src if hasattr(packet, 'ip') else None,
-                        'dst_ip': packet.ip.dst if hasattr(packet, 'ip') else None,
-                        'domain': dns_layer.qry_name,
-                        'qry_type': dns_layer.get('qry_type', 'N/A')
-                    }
-                    dns_records.append(record)
+                    dns_records.add_record(
+                        timestamp,
+                        packet.ip.src if hasattr(packet, 'ip') else None,
+                        packet.ip.dst if hasattr(packet, 'ip') else None,
+                        dns_layer.qry_name,
+                        dns_layer.get('qry_type', 'N/A'),
+                        dns_layer.get('flags_rcode') if is_response else None,
+                    )
 
     except Exception as e:
         print(f"[!] Ошибка при обработке пакетов: {e}")
@@ -88,49 +122,59 @@ def extract_dns_requests(pcap_file, tshark_path=None):
 # ==========================
 #  Сохранение результатов
 # ==========================
-def save_results(dns_records, all_ips):
-    if dns_records:
-        df = pd.DataFrame(dns_records)
-        df['time'] = df['time'].astype(str)
-        df.to_csv(OUTPUT_CSV, index=False)
-        print(f"[+] DNS-запросы сохранены в {OUTPUT_CSV}")
+def make_writer(compression=None, buffer_rows=DEFAULT_BUFFER_ROWS):
+    return DnsStreamWriter(OUTPUT_CSV, OUTPUT_NDJSON, UNIQUE_IPS_FILE, compression, buffer_rows)
 
-        with open(OUTPUT_JSON, 'w', encoding='utf-8') as f:
-            json.dump(dns_records, f, indent=2, default=str)
-        print(f"[+] DNS-запросы сохранены в {OUTPUT_JSON}")
 
+def save_results(dns_records, all_ips, writer=None, written=False, write_json=False):
+    """Сохраняет CSV, NDJSON и список IP (и, если write_json, прежний JSON-массив).
+
+    written=True — записи уже ушли в writer по ходу разбора,
+    остаётся дописать буферы и отсортированный список IP.
+    """
+    writer = writer or make_writer()
+    if not written:
+        writer.open()
+        writer.write_store(dns_records)
+    writer.close(all_ips)
+
+    if len(dns_records):
+        print(f"[+] DNS-запросы сохранены в {writer.csv_path}")
+        print(f"[+] DNS-запросы сохранены в {writer.ndjson_path}")
+        if write_json:
+            ndjson_to_json(writer.ndjson_path, OUTPUT_JSON, writer.compression)
+            print(f"[+] DNS-запросы сохранены в {OUTPUT_JSON}")
     if all_ips:
-        with open(UNIQUE_IPS_FILE, 'w') as f:
-            for ip in sorted(all_ips):
-                f.write(ip + '\n')
         print(f"[+] Уникальные IP-адреса сохранены в {UNIQUE_IPS_FILE}")
 
+
+def save_timeseries(dns_records):
+    if not dns_records.timeline.total():
+        return
+    dns_records.timeline.write_csv(TIMESERIES_CSV)
+    labels = ", ".join(resolution_label(value) for value in dns_records.timeline.resolutions)
+    print(f"[+] Число запросов по интервалам ({labels}) сохранено в {TIMESERIES_CSV}")
+
 # ==========================
 #  Визуализация
 # ==========================
-def plot_dns_timeline(dns_records):
-    if not dns_records:
+def plot_dns_timeline(dns_records, resolution=PLOT_RESOLUTION):
+    if not len(dns_records):
         print("[!] Нет DNS-запросов для построения графика.")
         return
 
-    df = pd.DataFrame(dns_records)
-    df = df[df['time'].notna()].copy()
-    if df.empty:
+    # Счётчики заполнены ещё при разборе: здесь только выгрузка готовых интервалов.
+    dns_per_interval = dns_records.timeline.series(resolution)
+    if dns_per_interval.empty:
         print("[!] Нет временных меток для построения графика.")
         return
 
-    df['time'] = pd.to_datetime(df['time'])
-    df.set_index('time', inplace=True)
-    df.sort_index(inplace=True)
-
-    dns_per_minute = df.resample('1min').size()
-
     plt.figure(figsize=(12, 6))
     sns.set_style("whitegrid")
-    plt.plot(dns_per_minute.index, dns_per_minute.values, marker='o', linestyle='-', color='b')
+    plt.plot(dns_per_interval.index, dns_per_interval.values, marker='o', linestyle='-', color='b')
     plt.title('Количество DNS-запросов по времени', fontsize=16)
     plt.xlabel('Время', fontsize=12)
-    plt.ylabel('Число запросов в минуту', fontsize=12)
+    plt.ylabel(f'Число запросов за {resolution_label(resolution)}', fontsize=12)
     plt.xticks(rotation=45)
     plt.tight_layout()
     plt.savefig(PLOT_FILE, dpi=150)
@@ -140,19 +184,17 @@ def plot_dns_timeline(dns_records):
 # ==========================
 #  Информация о доменах/IP
 # ==========================
-def print_suspicious_info(dns_records):
-    if not dns_records:
+def print_suspicious_info(dns_records, top=REPORT_TOP):
+    if not len(dns_records):
         return
-    df = pd.DataFrame(dns_records)
-    print("\n[+] Уникальные домены в DNS-запросах:")
-    unique_domains = df['domain'].unique()
-    for domain in sorted(unique_domains)[:20]:
-        print(f"    {domain}")
-    if len(unique_domains) > 20:
-        print(f"    ... и ещё {len(unique_domains)-20}")
+    # Статистика по всем доменам сохраняется целиком, на экран — только верх рейтинга.
+    stats = domain_stats(dns_records)
+    stats.to_csv(DOMAIN_STATS_CSV, index=False)
+    print_domain_report(stats, top)
+    print(f"[+] Статистика по {len(stats)} доменам сохранена в {DOMAIN_STATS_CSV}")
 
     print("\n[+] Уникальные IP-адреса источников DNS-запросов:")
-    unique_src = df['src_ip'].dropna().unique()
+    unique_src = dns_records.unique_src_ips()
     for ip in sorted(unique_src)[:20]:
         print(f"    {ip}")
     if len(unique_src) > 20:
@@ -161,24 +203,116 @@ def print_suspicious_info(dns_records):
 # ==========================
 #  Основная функция
 # ==========================
+def parse_args():
+    parser = argparse.ArgumentParser(description="Извлечение DNS-запросов из pcap (ДЗ №12)")
+    parser.add_argument("pcap", nargs="*", default=[PCAP_FILE], help="Файлы pcap/pcapng (можно несколько)")
+    parser.add_argument("--backend", choices=["native", "pyshark"], default=BACKEND, help="Чем разбирать дамп")
+    parser.add_argument("--tshark", default=TSHARK_PATH, help="Путь к tshark для --backend pyshark")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Процессов для --backend native: файлы (или части одного большого файла) разбираются параллельно",
+    )
+    parser.add_argument(
+        "--dns-only",
+        action="store_true",
+        help="Отбрасывать не-DNS пакеты до разбора (native: проверка порта 53 по сырым байтам, "
+        "pyshark: фильтр 'dns' в tshark); unique_ips.txt тогда содержит только адреса DNS-пакетов",
+    )
+    parser.add_argument(
+        "--display-filter",
+        help="Дисплей-фильтр Wireshark для --backend pyshark, например \"ip.addr == 10.0.0.1\"",
+    )
+    parser.add_argument("--compress", choices=["none", "gzip", "zstd"], default="none", help="Сжатие CSV и NDJSON")
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help=f"Дополнительно сохранить {OUTPUT_JSON} одним JSON-массивом, как в прежних версиях",
+    )
+    parser.add_argument(
+        "--buffer-rows",
+        type=int,
+        default=DEFAULT_BUFFER_ROWS,
+        help="Сколько строк копить в памяти перед записью на диск",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить прерванный разбор с последней контрольной точки (--backend native, один процесс)",
+    )
+    parser.add_argument(
+        "--timeline",
+        type=parse_resolutions,
+        default=TIMELINE_RESOLUTIONS,
+        help="Разрешения счётчиков по времени через запятую, например 1s,1min,1h",
+    )
+    parser.add_argument(
+        "--plot-resolution",
+        type=parse_resolution,
+        default=PLOT_RESOLUTION,
+        help="Интервал для графика (добавляется к --timeline), например 1min",
+    )
+    parser.add_argument("--top", type=int, default=REPORT_TOP, help="Сколько подозрительных доменов показать")
+    return parser.parse_args()
+
+
 def main():
-    ensure_event_loop()
+    args = parse_args()
 
-    if not os.path.exists(PCAP_FILE):
-        print(f"[!] Файл {PCAP_FILE} не найден. Поместите дамп в ту же папку или укажите правильный путь.")
+    for pcap_file in args.pcap:
+        if not os.path.exists(pcap_file):
+            print(f"[!] Файл {pcap_file} не найден. Поместите дамп в ту же папку или укажите правильный путь.")
+            return
+
+    try:
+        resolutions = parse_resolutions(",".join(f"{value}s" for value in (*args.timeline, args.plot_resolution)))
+    except ValueError as e:
+        print(f"[!] {e}")
         return
 
-    # Проверим, существует ли tshark по указанному пути
-    if not os.path.exists(TSHARK_PATH):
-        print(f"[!] tshark не найден по пути: {TSHARK_PATH}")
-        print("[!] Укажите правильный путь в переменной TSHARK_PATH.")
+    if args.display_filter and args.backend != "pyshark":
+        print("[!] --display-filter работает только с --backend pyshark; для native есть --dns-only.")
         return
 
-    dns_records, all_ips = extract_dns_requests(PCAP_FILE, tshark_path=TSHARK_PATH)
+    writer = make_writer(args.compress, args.buffer_rows)
+    if args.backend == "native":
+        dns_records, all_ips = extract_dns_native(
+            args.pcap,
+            workers=max(1, args.workers),
+            writer=writer,
+            resume=args.resume,
+            resolutions=resolutions,
+            dns_only=args.dns_only,
+        )
+        written = True
+    else:
+        ensure_event_loop()
+
+        # Проверим, существует ли tshark по указанному пути
+        if not os.path.exists(args.tshark):
+            print(f"[!] tshark не найден по пути: {args.tshark}")
+            print("[!] Укажите правильный путь в переменной TSHARK_PATH или через --tshark.")
+            return
+
+        if len(args.pcap) > 1:
+            print("[!] --backend pyshark обрабатывает только один файл.")
+            return
+        display_filter = args.display_filter
+        if args.dns_only:
+            display_filter = f"dns && ({display_filter})" if display_filter else "dns"
+        dns_records, all_ips = extract_dns_requests(
+            args.pcap[0],
+            tshark_path=args.tshark,
+            resolutions=resolutions,
+            display_filter=display_filter,
+        )
+        written = False
 
-    save_results(dns_records, all_ips)
-    plot_dns_timeline(dns_records)
-    print_suspicious_info(dns_records)
+    save_results(dns_records, all_ips, writer, written, args.json)
+    save_timeseries(dns_records)
+    plot_dns_timeline(dns_records, args.plot_resolution)
+    print_suspicious_info(dns_records, args.top)
 
     print("\n[*] Анализ завершён.")
 
@@ -0,0 +1,190 @@
+"""
+Аналитика по доменам из DnsRecordStore.
+
+Метрики по запросам (число запросов, уникальные источники, типы запросов,
+доля NXDOMAIN) считаются через np.bincount по номерам доменов — один
+проход по каждой колонке без цикла Python по записям. Запросы (QR=0,
+rcode = NO_RCODE) и ответы считаются раздельно: ответы идут только
+в долю NXDOMAIN. Длина меток и
+энтропия Шеннона считаются один раз на уникальное имя: байты всех имён
+склеиваются в один массив и обрабатываются целиком.
+"""
+
+import numpy as np
+import pandas as pd
+
+from dns_store import NO_IP, NO_RCODE, RCODE_NXDOMAIN
+
+QTYPE_NAMES = {
+    1: "A", 2: "NS", 5: "CNAME", 6: "SOA", 10: "NULL", 12: "PTR",
+    15: "MX", 16: "TXT", 28: "AAAA", 33: "SRV", 65: "HTTPS", 255: "ANY",
+}
+# Типы, через которые обычно гоняют данные DNS-туннели.
+TUNNEL_QTYPES = (10, 16, 255)
+
+# Вклад признаков в итоговую оценку; каждый признак приведён к [0, 1].
+SCORE_WEIGHTS = {
+    "entropy": 2.0,
+    "max_label_len": 1.0,
+    "length": 1.0,
+    "nxdomain_ratio": 2.0,
+    "tunnel_share": 2.0,
+}
+# Границы, между которыми признак линейно растёт от 0 до 1.
+ENTROPY_RANGE = (2.5, 4.0)
+MAX_LABEL_RANGE = (15, 50)
+LENGTH_RANGE = (30, 100)
+REPORT_TOP = 20
+
+
+def qtype_name(qtype):
+    return QTYPE_NAMES.get(qtype, str(qtype)) if qtype else "N/A"
+
+
+def scale(values, bounds):
+    low, high = bounds
+    return np.clip((values - low) / (high - low), 0.0, 1.0)
+
+
+def name_features(domains):
+    """Число меток, длина самой длинной метки, длина имени и энтропия.
+
+    Энтропия считается по имени без зоны верхнего уровня и точек: у
+    DGA-доменов и туннелей случайна именно левая часть.
+    """
+    count = len(domains)
+    encoded = [domain.encode("utf-8", "replace") for domain in domains]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=count)
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    owners = np.repeat(np.arange(count), lengths)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    dots = data == ord(".")
+    labels = np.bincount(owners, weights=dots, minlength=count).astype(np.int64) + 1
+
+    # Номер метки для каждого байта: новая метка начинается после точки
+    # и в начале каждого имени.
+    label_start = np.zeros(len(data), dtype=bool)
+    label_start[starts[lengths > 0]] = True
+    label_start[1:] |= dots[:-1]
+    label_ids = np.cumsum(label_start) - 1
+    label_lengths = np.bincount(label_ids, weights=~dots).astype(np.int64) if len(data) else np.empty(0, np.int64)
+    first_label = label_ids[starts[lengths > 0]]
+    max_label = np.zeros(count, dtype=np.int64)
+    if len(first_label):
+        max_label[lengths > 0] = np.maximum.reduceat(label_lengths, first_label)
+
+    # Отрезаем последнюю метку (TLD), если меток больше одной.
+    positions = np.flatnonzero(dots)
+    dot_owners = owners[positions]
+    last = np.flatnonzero(np.diff(dot_owners, append=-1) != 0)
+    cut = starts + lengths
+    cut[dot_owners[last]] = positions[last]
+    keep = (np.arange(len(data)) < cut[owners]) & ~dots
+
+    entropy = np.zeros(count)
+    if keep.any():
+        kept_owners = owners[keep]
+        keys = np.sort(kept_owners * 256 + data[keep])
+        bounds = np.flatnonzero(np.diff(keys, prepend=-1) != 0)
+        counts = np.diff(bounds, append=len(keys))
+        key_owners = keys[bounds] // 256
+        totals = np.bincount(kept_owners, minlength=count)
+        p = counts / totals[key_owners]
+        entropy = -np.bincount(key_owners, weights=p * np.log2(p), minlength=count)
+    return labels, max_label, lengths, entropy
+
+
+def domain_stats(dns_records):
+    """DataFrame со статистикой по каждому домену, отсортированный по убыванию оценки."""
+    domains = dns_records.domains
+    count = len(domains)
+    domain_ids = dns_records.column("domain_ids").astype(np.int64)
+    rcodes = dns_records.column("rcodes")
+
+    # Ответ на запрос несёт то же имя: без разделения домен, которому
+    # отвечают, получал бы вдвое больше «запросов».
+    is_query = rcodes == NO_RCODE
+    query_ids = domain_ids[is_query]
+    queries = np.bincount(query_ids, minlength=count)
+
+    # Уникальные источники: уникальные пары (домен, IPv4-источник запроса).
+    # Сортировка + diff вместо np.unique: на десятках миллионов ключей
+    # это в разы быстрее.
+    src = dns_records.column("src")[is_query]
+    known = src != NO_IP
+    pairs = np.sort((query_ids[known] << 32) | src[known])
+    first = np.ones(len(pairs), dtype=bool)
+    first[1:] = pairs[1:] != pairs[:-1]
+    unique_src = np.bincount(pairs[first] >> 32, minlength=count)
+
+    # Типы запросов: таблица домен x тип через одну bincount.
+    qtypes = dns_records.column("qtypes")[is_query]
+    present = np.flatnonzero(np.bincount(qtypes, minlength=1))
+    lookup = np.zeros(int(present.max()) + 1 if len(present) else 1, dtype=np.int64)
+    lookup[present] = np.arange(len(present))
+    mix = np.bincount(
+        query_ids * len(present) + lookup[qtypes],
+        minlength=count * len(present),
+    ).reshape(count, len(present))
+
+    responses = np.bincount(domain_ids, weights=~is_query, minlength=count)
+    nxdomain = np.bincount(domain_ids, weights=rcodes == RCODE_NXDOMAIN, minlength=count)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        nxdomain_ratio = np.where(responses > 0, nxdomain / responses, np.nan)
+
+    labels, max_label, lengths, entropy = name_features(domains)
+
+    tunnel_columns = [index for index, qtype in enumerate(present) if qtype in TUNNEL_QTYPES]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        tunnel_share = mix[:, tunnel_columns].sum(axis=1) / np.maximum(queries, 1)
+
+    score = (
+        SCORE_WEIGHTS["entropy"] * scale(entropy, ENTROPY_RANGE)
+        + SCORE_WEIGHTS["max_label_len"] * scale(max_label, MAX_LABEL_RANGE)
+        + SCORE_WEIGHTS["length"] * scale(lengths, LENGTH_RANGE)
+        + SCORE_WEIGHTS["nxdomain_ratio"] * np.nan_to_num(nxdomain_ratio)
+        + SCORE_WEIGHTS["tunnel_share"] * tunnel_share
+    )
+
+    stats = pd.DataFrame({
+        "domain": domains,
+        "queries": queries,
+        "unique_src": unique_src,
+        "responses": responses.astype(np.int64),
+        "nxdomain_ratio": nxdomain_ratio.round(3),
+        "labels": labels,
+        "max_label_len": max_label,
+        "length": lengths,
+        "entropy": entropy.round(3),
+        "tunnel_share": tunnel_share.round(3),
+        "score": score.round(3),
+    })
+    for index, qtype in enumerate(present):
+        stats[f"qtype_{qtype_name(int(qtype))}"] = mix[:, index]
+    return stats.sort_values(["score", "queries"], ascending=[False, False], kind="stable").reset_index(drop=True)
+
+
+def qtype_mix(row, columns, limit=3):
+    """Строка вида 'A 70%, AAAA 30%' для отчёта."""
+    counts = sorted(((row[column], column[len("qtype_"):]) for column in columns if row[column]), reverse=True)
+    total = sum(value for value, _ in counts) or 1
+    return ", ".join(f"{name} {value * 100 // total}%" for value, name in counts[:limit])
+
+
+def print_domain_report(stats, top=REPORT_TOP):
+    if stats.empty:
+        return
+    qtype_columns = [column for column in stats.columns if column.startswith("qtype_")]
+    has_responses = bool(stats["responses"].any())
+
+    print(f"\n[+] Топ-{min(top, len(stats))} подозрительных доменов (из {len(stats)}):")
+    print(f"    {'оценка':>6}  {'запр.':>7}  {'ист.':>5}  {'энтр.':>5}  {'метка':>5}  {'NXD':>5}  домен [типы]")
+    for _, row in stats.head(top).iterrows():
+        nxdomain = f"{row['nxdomain_ratio']:.0%}" if row["responses"] else "-"
+        print(
+            f"    {row['score']:>6.2f}  {row['queries']:>7}  {row['unique_src']:>5}  {row['entropy']:>5.2f}  "
+            f"{row['max_label_len']:>5}  {nxdomain:>5}  {row['domain']} [{qtype_mix(row, qtype_columns)}]"
+        )
+    if not has_responses:
+        print("    (ответов DNS в дампе нет — доля NXDOMAIN не считалась)")
@@ -0,0 +1,153 @@
+"""
+Счётчики DNS-запросов по интервалам времени.
+
+TimelineCounter заполняется по ходу разбора дампа и хранит только
+непустые интервалы для каждого разрешения (например, 1 с, 1 мин и 1 ч
+одновременно) — память O(интервалов), а не O(пакетов). График и
+экспорт временного ряда читают готовые счётчики без DataFrame
+со всеми записями и без сортировки.
+
+Интервалы выровнены по Unix-времени; подписи переводятся в локальное
+время (как sniff_time у pyshark) только при выгрузке.
+"""
+
+import csv
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+EPOCH = datetime(1970, 1, 1)
+RESOLUTION_UNITS = {"s": 1, "min": 60, "h": 3600, "d": 86400}
+DEFAULT_RESOLUTIONS = (1, 60, 3600)
+
+
+def parse_resolution(text):
+    """'30s', '1min', '1h', '1d' -> число секунд."""
+    match = re.fullmatch(r"\s*(\d+)\s*(s|min|h|d)\s*", text)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Неверное разрешение: {text!r} (примеры: 1s, 1min, 1h)")
+    return int(match.group(1)) * RESOLUTION_UNITS[match.group(2)]
+
+
+def parse_resolutions(text):
+    resolutions = sorted({parse_resolution(item) for item in text.split(",") if item.strip()})
+    if not resolutions:
+        raise ValueError("Не задано ни одного разрешения")
+    if any(value % resolutions[0] for value in resolutions):
+        raise ValueError("Все разрешения должны быть кратны самому мелкому")
+    return tuple(resolutions)
+
+
+def resolution_label(seconds):
+    for unit, size in sorted(RESOLUTION_UNITS.items(), key=lambda item: -item[1]):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+
+def local_datetimes(timestamps):
+    """Unix-время -> локальное время без tz, как datetime.fromtimestamp, но для массива.
+
+    Смещение зоны считается один раз на каждые 15 минут (переходы на летнее
+    время не бывают чаще), а не для каждой записи.
+    """
+    known = ~np.isnan(timestamps)
+    micros = np.round(timestamps[known] * 1e6).astype(np.int64)
+    slots = micros // 900_000_000
+    unique_slots, inverse = np.unique(slots, return_inverse=True)
+    offsets = np.array(
+        [
+            round((datetime.fromtimestamp(slot * 900) - EPOCH).total_seconds()) - slot * 900
+            for slot in unique_slots.tolist()
+        ],
+        dtype=np.int64,
+    )
+    result = np.full(len(timestamps), np.datetime64("NaT"), dtype="datetime64[ns]")
+    result[known] = ((micros + offsets[inverse] * 1_000_000) * 1000).astype("datetime64[ns]")
+    return result
+
+
+class TimelineCounter:
+    def __init__(self, resolutions=DEFAULT_RESOLUTIONS):
+        self.resolutions = tuple(sorted(set(resolutions)))
+        self.buckets = {resolution: {} for resolution in self.resolutions}
+        self.unknown = 0  # записи без времени
+        # Пакеты идут почти по порядку времени, поэтому подряд идущие записи
+        # одного мелкого интервала копятся в _pending и раскладываются по
+        # всем разрешениям только при смене интервала.
+        self._base = self.resolutions[0]
+        self._current = None
+        self._pending = 0
+
+    def add(self, timestamp):
+        if timestamp is not None:
+            bucket = timestamp // self._base
+            if bucket == self._current:
+                self._pending += 1
+                return
+            if bucket == bucket:  # NaN — время неизвестно
+                self._flush()
+                self._current = bucket
+                self._pending = 1
+                return
+        self.unknown += 1
+
+    def _flush(self):
+        if self._pending:
+            start = int(self._current) * self._base
+            for resolution, counts in self.buckets.items():
+                key = start // resolution
+                counts[key] = counts.get(key, 0) + self._pending
+            self._pending = 0
+
+    def merge(self, other):
+        if other.resolutions != self.resolutions:
+            raise ValueError("Нельзя объединить счётчики с разными разрешениями")
+        self._flush()
+        other._flush()
+        for resolution, counts in other.buckets.items():
+            target = self.buckets[resolution]
+            for key, value in counts.items():
+                target[key] = target.get(key, 0) + value
+        self.unknown += other.unknown
+
+    def copy(self):
+        self._flush()
+        result = TimelineCounter(self.resolutions)
+        result.buckets = {resolution: dict(counts) for resolution, counts in self.buckets.items()}
+        result.unknown = self.unknown
+        return result
+
+    def total(self):
+        self._flush()
+        return sum(self.buckets[self._base].values())
+
+    def series(self, resolution):
+        """pd.Series с числом запросов на интервал, включая пустые интервалы между крайними."""
+        self._flush()
+        counts = self.buckets[resolution]
+        if not counts:
+            return pd.Series(dtype=np.int64)
+        keys = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        first = keys.min()
+        dense = np.zeros(keys.max() - first + 1, dtype=np.int64)
+        dense[keys - first] = values
+        starts = (np.arange(first, keys.max() + 1) * resolution).astype(np.float64)
+        return pd.Series(dense, index=pd.DatetimeIndex(local_datetimes(starts)))
+
+    def write_csv(self, path):
+        """Все разрешения в одном файле: resolution,time,count; только непустые интервалы."""
+        self._flush()
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["resolution", "time", "count"])
+            for resolution in self.resolutions:
+                counts = self.buckets[resolution]
+                keys = np.array(sorted(counts), dtype=np.int64)
+                times = local_datetimes((keys * resolution).astype(np.float64))
+                label = resolution_label(resolution)
+                for moment, key in zip(pd.DatetimeIndex(times).strftime("%Y-%m-%d %H:%M:%S"), keys.tolist()):
+                    writer.writerow([label, moment, counts[key]])
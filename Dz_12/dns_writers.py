@@ -0,0 +1,313 @@
+"""
+Потоковая запись результатов Dz_12: CSV и NDJSON дописываются порциями
+по мере разбора пакетов, список IP — по мере появления новых адресов.
+
+В памяти держится не больше buffer_rows строк. Через каждые
+CHECKPOINT_EVERY пакетов буферы сбрасываются на диск, а в файл состояния
+записываются размеры выходных файлов и позиция в дампе. После прерывания
+запуск с --resume обрезает выходные файлы до последней контрольной точки
+и продолжает разбор с сохранённого смещения.
+
+Сжатие: gzip (stdlib) или zstd (pip install zstandard). На каждой
+контрольной точке закрывается текущий gzip-член / zstd-фрейм, поэтому
+обрезанный по точке файл остаётся корректным архивом.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import socket
+from datetime import datetime
+
+from dns_store import NO_IP, NO_RCODE, UNKNOWN_QTYPE, DnsRecordStore, int_to_ip, ip_to_int
+from dns_timeline import DEFAULT_RESOLUTIONS
+
+try:
+    import zstandard
+except ImportError:  # zstd нужен только для --compress zstd
+    zstandard = None
+
+DEFAULT_BUFFER_ROWS = 10_000
+CHECKPOINT_EVERY = 200_000
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+CSV_HEADER = ['time', 'src_ip', 'dst_ip', 'domain', 'qry_type', 'rcode']
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+STATE_VERSION = 2
+
+
+def output_path(path, compression):
+    suffix = COMPRESSION_SUFFIXES.get(compression, "")
+    return path if not suffix or path.endswith(suffix) else path + suffix
+
+
+def json_string(value):
+    return "null" if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def parse_time(value):
+    return datetime.strptime(value, TIME_FORMAT).timestamp() if value else None
+
+
+class OutputFile:
+    """Файл, дописываемый с опциональным сжатием; sync() фиксирует точку восстановления."""
+
+    def __init__(self, path, compression=None, append=False):
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError("Для --compress zstd установите пакет zstandard")
+        self.path = path
+        self.compression = compression
+        self.raw = open(path, "ab" if append else "wb")
+        self._stream = None
+
+    def write(self, data):
+        if self._stream is None:
+            if self.compression == "gzip":
+                self._stream = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=6)
+            elif self.compression == "zstd":
+                self._stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+            else:
+                self._stream = self.raw
+        self._stream.write(data)
+
+    def sync(self):
+        """Закрывает gzip-член / zstd-фрейм, сбрасывает файл на диск и возвращает его размер."""
+        if self._stream is not None and self._stream is not self.raw:
+            if self.compression == "zstd":
+                self._stream.flush(zstandard.FLUSH_FRAME)
+            else:
+                self._stream.close()  # fileobj при этом остаётся открытым
+                self._stream = None
+        self.raw.flush()
+        os.fsync(self.raw.fileno())
+        return self.raw.tell()
+
+    def close(self):
+        self.sync()
+        if self._stream is not None and self._stream is not self.raw:
+            self._stream.close()
+        self.raw.close()
+
+
+def ndjson_to_json(ndjson_path, json_path, compression=None):
+    """Переписывает NDJSON в JSON-массив прежнего формата (indent=2) построчно, без загрузки в память."""
+    with open_text(ndjson_path, compression) as src, open(json_path, "w", encoding="utf-8") as dst:
+        first = True
+        for line in src:
+            if not line.strip():
+                continue
+            record = json.dumps(json.loads(line), indent=2).replace("\n", "\n  ")
+            dst.write(("[\n  " if first else ",\n  ") + record)
+            first = False
+        dst.write("[]" if first else "\n]")
+
+
+def open_text(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Для чтения .zst установите пакет zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+class DnsStreamWriter:
+    def __init__(
+        self,
+        csv_path,
+        ndjson_path,
+        ips_path,
+        compression=None,
+        buffer_rows=DEFAULT_BUFFER_ROWS,
+    ):
+        self.compression = compression if compression in COMPRESSION_SUFFIXES else None
+        self.csv_path = output_path(csv_path, self.compression)
+        self.ndjson_path = output_path(ndjson_path, self.compression)
+        self.ips_path = ips_path
+        # Адреса пишутся сразу, без сортировки; итоговый отсортированный
+        # список строится в close(), а этот файл нужен для --resume.
+        self.ips_partial_path = ips_path + ".partial"
+        self.state_path = self.csv_path + ".resume.json"
+        self.buffer_rows = max(1, buffer_rows)
+
+        self._csv_buffer = io.StringIO()
+        self._csv = csv.writer(self._csv_buffer, lineterminator=os.linesep)
+        self._ndjson_lines = []
+        self._ip_lines = []
+        self._ip_names = {}
+        # Кэши форматирования: в дампе мало разных IPv4 и секунд.
+        self._ipv4_names = {NO_IP: None}
+        self._second = None
+        self._second_text = ""
+        self._files = None
+        self.rows = 0
+
+    # --------------------------
+    #  Открытие и восстановление
+    # --------------------------
+    def open(self):
+        self._files = {
+            "csv": OutputFile(self.csv_path, self.compression),
+            "ndjson": OutputFile(self.ndjson_path, self.compression),
+            "ips": OutputFile(self.ips_partial_path),
+        }
+        self._csv.writerow(CSV_HEADER)
+        return self
+
+    def resume(self, pcap_file, resolutions=DEFAULT_RESOLUTIONS):
+        """Продолжает прерванный запуск по тому же дампу.
+
+        Возвращает (offset, section, packet_count, store, ip_names) или None,
+        если состояния нет или оно относится к другому файлу — тогда
+        выходные файлы открываются заново.
+        """
+        state = self._load_state(pcap_file)
+        if state is None:
+            self.open()
+            return None
+
+        files = {}
+        for key, path in (("csv", self.csv_path), ("ndjson", self.ndjson_path), ("ips", self.ips_partial_path)):
+            with open(path, "r+b") as f:
+                f.truncate(state["sizes"][key])
+            files[key] = OutputFile(path, self.compression if key != "ips" else None, append=True)
+        self._files = files
+        self.rows = state["rows"]
+
+        store = DnsRecordStore(resolutions)
+        with open_text(self.csv_path, self.compression) as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for time_value, src_ip, dst_ip, domain, qry_type, rcode in reader:
+                store.append(
+                    parse_time(time_value),
+                    ip_to_int(src_ip),
+                    ip_to_int(dst_ip),
+                    domain,
+                    int(qry_type) if qry_type.isdigit() else UNKNOWN_QTYPE,
+                    int(rcode) if rcode else NO_RCODE,
+                )
+
+        with open(self.ips_partial_path, "r", encoding="utf-8") as f:
+            for line in f:
+                ip = line.strip()
+                if ip:
+                    family = socket.AF_INET6 if ":" in ip else socket.AF_INET
+                    self._ip_names[socket.inet_pton(family, ip)] = ip
+
+        section = state["section"]
+        if section is not None:
+            section = (section[0], tuple(tuple(item) for item in section[1]))
+        return state["offset"], section, state["packet_count"], store, self._ip_names
+
+    def _load_state(self, pcap_file):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stat = os.stat(pcap_file)
+        if (
+            state.get("version") != STATE_VERSION
+            or state.get("pcap") != os.path.abspath(pcap_file)
+            or state.get("pcap_size") != stat.st_size
+            or state.get("compression") != self.compression
+        ):
+            print("[!] Файл состояния относится к другому запуску, начинаем заново.")
+            return None
+        return state
+
+    # --------------------------
+    #  Запись
+    # --------------------------
+    def write_record(self, timestamp, src, dst, domain, qtype, rcode=NO_RCODE):
+        """Строка в «сыром» виде, как в DnsRecordStore.append."""
+        time_value = self._format_time(timestamp)
+        names = self._ipv4_names
+        src_ip = names[src] if src in names else names.setdefault(src, int_to_ip(src))
+        dst_ip = names[dst] if dst in names else names.setdefault(dst, int_to_ip(dst))
+        qry_type = str(qtype) if qtype != UNKNOWN_QTYPE else 'N/A'
+        rcode_value = rcode if rcode != NO_RCODE else None
+        self._csv.writerow((time_value, src_ip, dst_ip, domain, qry_type, rcode_value))
+        # Все поля, кроме домена, не требуют экранирования — собираем строку
+        # без json.dumps для словаря, это заметно быстрее.
+        self._ndjson_lines.append(
+            f'{{"time": {json_string(time_value)}, "src_ip": {json_string(src_ip)}, '
+            f'"dst_ip": {json_string(dst_ip)}, "domain": {json_string(domain)}, "qry_type": "{qry_type}", '
+            f'"rcode": {"null" if rcode_value is None else rcode_value}}}'
+        )
+        self.rows += 1
+        if len(self._ndjson_lines) >= self.buffer_rows:
+            self.flush()
+
+    def _format_time(self, timestamp):
+        if timestamp != timestamp:
+            return None
+        moment = datetime.fromtimestamp(timestamp)
+        second = (moment.year, moment.month, moment.day, moment.hour, moment.minute, moment.second)
+        if second != self._second:
+            self._second = second
+            self._second_text = moment.strftime("%Y-%m-%d %H:%M:%S")
+        return f"{self._second_text}.{moment.microsecond:06d}"
+
+    def write_store(self, store):
+        for row in zip(store.times, store.src, store.dst, store.domain_ids, store.qtypes, store.rcodes):
+            self.write_record(row[0], row[1], row[2], store.domains[row[3]], row[4], row[5])
+
+    def add_ip(self, raw):
+        if raw not in self._ip_names:
+            name = socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+            self._ip_names[raw] = name
+            self._ip_lines.append(name)
+            if len(self._ip_lines) >= self.buffer_rows:
+                self.flush()
+
+    def flush(self):
+        csv_text = self._csv_buffer.getvalue()
+        if csv_text:
+            self._files["csv"].write(csv_text.encode("utf-8"))
+            self._csv_buffer.seek(0)
+            self._csv_buffer.truncate()
+        if self._ndjson_lines:
+            self._files["ndjson"].write(("\n".join(self._ndjson_lines) + "\n").encode("utf-8"))
+            self._ndjson_lines = []
+        if self._ip_lines:
+            self._files["ips"].write(("\n".join(self._ip_lines) + "\n").encode("utf-8"))
+            self._ip_lines = []
+
+    def checkpoint(self, pcap_file, offset, section, packet_count):
+        """Фиксирует, что всё до offset в дампе уже записано."""
+        self.flush()
+        state = {
+            "version": STATE_VERSION,
+            "pcap": os.path.abspath(pcap_file),
+            "pcap_size": os.stat(pcap_file).st_size,
+            "compression": self.compression,
+            "offset": offset,
+            "section": section,
+            "packet_count": packet_count,
+            "rows": self.rows,
+            "sizes": {key: output.sync() for key, output in self._files.items()},
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def close(self, all_ips=None):
+        """Дописывает буферы, сохраняет отсортированный список IP и убирает файл состояния."""
+        self.flush()
+        for output in self._files.values():
+            output.close()
+
+        ips = sorted(all_ips if all_ips is not None else self._ip_names.values())
+        if ips:
+            with open(self.ips_path, 'w') as f:
+                for ip in ips:
+                    f.write(ip + '\n')
+        for path in (self.ips_partial_path, self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
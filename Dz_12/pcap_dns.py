@@ -0,0 +1,629 @@
+"""
+Быстрое извлечение DNS-запросов из pcap/pcapng без tshark и pyshark.
+
+Файл отображается в память (mmap), а из каждого пакета разбираются только
+заголовки канального уровня, IPv4/IPv6, UDP/TCP и секция вопросов DNS.
+Результат (в виде DnsRecordStore) совпадает с extract_dns_requests из Dz_12.py:
+  - all_ips — адреса внешнего IPv4-заголовка (или IPv6, если IPv4 нет);
+  - dns_records — по записи на каждый DNS-пакет (запрос или ответ)
+    на порту 53 с первым вопросом: время, IPv4-адреса, имя и тип.
+
+Ограничения: IP-фрагменты не собираются (DNS во фрагментах пропускается),
+DNS поверх TCP разбирается, только если сообщение целиком лежит в одном сегменте.
+"""
+
+import mmap
+import os
+import socket
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from dns_store import NO_IP, NO_RCODE, DnsRecordStore
+from dns_timeline import DEFAULT_RESOLUTIONS
+from dns_writers import CHECKPOINT_EVERY
+
+DNS_PORT = 53
+PROGRESS_EVERY = 100_000
+# Шард меньше этого размера не выделяем: накладные расходы процесса дороже.
+MIN_SHARD_BYTES = 4 * 1024 * 1024
+# Сколько подряд корректных заголовков нужно, чтобы признать смещение границей пакета.
+SHARD_SYNC_RECORDS = 8
+SHARD_SYNC_WINDOW = 1024 * 1024
+MAX_SNAPLEN = 262_144
+
+# Типы канального уровня (LINKTYPE_*)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_RAW_OPENBSD = 12
+LINKTYPE_RAW_ALT = 14
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# Значения AF_INET6 в заголовке BSD loopback различаются между ОС.
+NULL_AF_INET = 2
+NULL_AF_INET6 = (10, 24, 28, 30)
+
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+IPV6_FRAGMENT_HEADER = 44
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+PCAPNG_OPT_TSRESOL = 9
+
+U16 = struct.Struct("!H")
+U32_LE = struct.Struct("<I")
+U32_BE = struct.Struct(">I")
+PORTS = struct.Struct("!HH")
+
+
+class PcapFormatError(ValueError):
+    pass
+
+
+# ==========================
+#  Чтение контейнера pcap / pcapng
+# ==========================
+def read_pcap_header(buf):
+    """(endian, scale, linktype, snaplen) из глобального заголовка pcap."""
+    magic = U32_LE.unpack_from(buf, 0)[0]
+    if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        endian = "<"
+    else:
+        endian = ">"
+        magic = U32_BE.unpack_from(buf, 0)[0]
+    scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+    snaplen, linktype = struct.unpack_from(endian + "II", buf, 16)
+    return endian, scale, linktype & 0x0FFFFFFF, snaplen or MAX_SNAPLEN
+
+
+def iter_pcap_records(buf, start=24, end=None):
+    """Отдаёт (timestamp, linktype, offset, caplen, next_offset) для каждого пакета классического pcap."""
+    endian, scale, linktype, _ = read_pcap_header(buf)
+    record = struct.Struct(endian + "IIII")
+    offset = start
+    size = len(buf)
+    end = size if end is None else end
+    while offset + 16 <= end:
+        ts_sec, ts_frac, caplen, _ = record.unpack_from(buf, offset)
+        offset += 16
+        if offset + caplen > size:
+            break  # файл обрезан на середине пакета
+        yield ts_sec + ts_frac * scale, linktype, offset, caplen, offset + caplen
+        offset += caplen
+
+
+def parse_tsresol(buf, offset, end, endian):
+    """Читает if_tsresol из опций IDB; по умолчанию микросекунды."""
+    option = struct.Struct(endian + "HH")
+    while offset + 4 <= end:
+        code, length = option.unpack_from(buf, offset)
+        if code == 0:
+            break
+        if code == PCAPNG_OPT_TSRESOL and length >= 1:
+            value = buf[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+
+def iter_pcapng_records(buf, start=0, end=None, section=None):
+    """Отдаёт (timestamp, linktype, offset, caplen, next_offset) для каждого пакета pcapng.
+
+    section — (endian, interfaces) на момент start, если чтение начинается
+    не с начала файла.
+    """
+    size = len(buf)
+    end = size if end is None else end
+    offset = start
+    endian, interfaces = section if section is not None else ("<", [])
+    interfaces = list(interfaces)
+    while offset + 12 <= end:
+        block_type = U32_LE.unpack_from(buf, offset)[0]
+        if block_type == PCAPNG_SHB:
+            # Порядок байтов задаётся каждой секцией заново.
+            endian = "<" if U32_LE.unpack_from(buf, offset + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            interfaces = []
+        else:
+            block_type = struct.unpack_from(endian + "I", buf, offset)[0]
+        block_len = struct.unpack_from(endian + "I", buf, offset + 4)[0]
+        if block_len < 12 or offset + block_len > size:
+            break
+        body = offset + 8
+
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + "H", buf, body)[0]
+            interfaces.append((linktype, parse_tsresol(buf, body + 8, offset + block_len - 4, endian)))
+        elif block_type == PCAPNG_EPB:
+            iface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", buf, body)
+            if iface < len(interfaces):
+                linktype, scale = interfaces[iface]
+                yield ((ts_high << 32) | ts_low) * scale, linktype, body + 20, caplen, offset + block_len
+        elif block_type == PCAPNG_SPB and interfaces:
+            caplen = block_len - 16
+            yield None, interfaces[0][0], body + 4, caplen, offset + block_len
+
+        offset += block_len
+
+
+def is_pcapng(buf):
+    return U32_LE.unpack_from(buf, 0)[0] == PCAPNG_SHB
+
+
+def iter_capture_records(buf, start=None, end=None, section=None):
+    if len(buf) < 24:
+        raise PcapFormatError("Файл слишком мал для pcap/pcapng")
+    if is_pcapng(buf):
+        return iter_pcapng_records(buf, start or 0, end, section)
+    magic = U32_LE.unpack_from(buf, 0)[0]
+    if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS) or U32_BE.unpack_from(buf, 0)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+        return iter_pcap_records(buf, start or 24, end)
+    raise PcapFormatError(f"Неизвестный формат дампа (magic {magic:#010x})")
+
+
+# ==========================
+#  Разбиение дампа на шарды
+# ==========================
+def is_pcap_boundary(buf, offset, header):
+    """Похоже ли смещение на начало цепочки записей pcap."""
+    endian, scale, _, snaplen = header
+    record = struct.Struct(endian + "IIII")
+    frac_limit = round(1 / scale)
+    size = len(buf)
+    prev_sec = None
+    for _ in range(SHARD_SYNC_RECORDS):
+        if offset == size:
+            return True
+        if offset + 16 > size:
+            return False
+        ts_sec, ts_frac, caplen, orig_len = record.unpack_from(buf, offset)
+        if ts_frac >= frac_limit or caplen > snaplen or caplen > orig_len or offset + 16 + caplen > size:
+            return False
+        if prev_sec is not None and abs(ts_sec - prev_sec) > 86_400:
+            return False
+        prev_sec = ts_sec
+        offset += 16 + caplen
+    return True
+
+
+def is_pcapng_boundary(buf, offset, endian):
+    """Похоже ли смещение на начало цепочки блоков pcapng (длина дублируется в конце блока)."""
+    size = len(buf)
+    length = struct.Struct(endian + "I")
+    for _ in range(SHARD_SYNC_RECORDS):
+        if offset == size:
+            return True
+        if offset + 12 > size:
+            return False
+        block_type, block_len = struct.unpack_from(endian + "II", buf, offset)
+        if block_type in (PCAPNG_SHB, PCAPNG_IDB) or block_len < 12 or block_len % 4:
+            return False
+        if offset + block_len > size or length.unpack_from(buf, offset + block_len - 4)[0] != block_len:
+            return False
+        offset += block_len
+    return True
+
+
+def pcapng_first_section(buf):
+    """(endian, interfaces, смещение первого пакета) или None, если секций несколько."""
+    # Поиск по mmap идёт на скорости C, поэтому второй SHB находим дёшево.
+    if buf.find(struct.pack("<I", PCAPNG_SHB), 4) != -1:
+        return None
+    endian = "<" if U32_LE.unpack_from(buf, 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+    interfaces = []
+    offset = 0
+    size = len(buf)
+    while offset + 12 <= size:
+        block_type, block_len = struct.unpack_from(endian + "II", buf, offset)
+        if block_type in (PCAPNG_EPB, PCAPNG_SPB) or block_len < 12:
+            break
+        if block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + "H", buf, offset + 8)[0]
+            interfaces.append((linktype, parse_tsresol(buf, offset + 16, offset + block_len - 4, endian)))
+        offset += block_len
+    return endian, interfaces, offset
+
+
+def plan_shards(buf, count):
+    """Делит дамп на count кусков примерно равного размера по границам пакетов.
+
+    Граница ищется от целевого смещения вперёд: смещение принимается, если
+    с него читается цепочка из SHARD_SYNC_RECORDS корректных заголовков.
+    Возвращает [(start, end, section)], section — состояние pcapng для шарда.
+    Если граница не нашлась (или в pcapng несколько секций), шарды сливаются.
+    """
+    size = len(buf)
+    if is_pcapng(buf):
+        first = pcapng_first_section(buf)
+        if first is None:
+            return [(0, size, None)]
+        endian, interfaces, data_start = first
+        section = (endian, tuple(interfaces))
+        check = lambda offset: is_pcapng_boundary(buf, offset, endian)
+    else:
+        header = read_pcap_header(buf)
+        data_start, section = 24, None
+        check = lambda offset: is_pcap_boundary(buf, offset, header)
+
+    count = max(1, min(count, (size - data_start) // MIN_SHARD_BYTES))
+    step = (size - data_start) // count
+    bounds = [data_start]
+    for index in range(1, count):
+        target = max(data_start + index * step, bounds[-1] + 1)
+        for offset in range(target, min(size, target + SHARD_SYNC_WINDOW)):
+            if check(offset):
+                bounds.append(offset)
+                break
+    bounds.append(size)
+    return [(bounds[i], bounds[i + 1], section) for i in range(len(bounds) - 1)]
+
+
+# ==========================
+#  Разбор заголовков
+# ==========================
+def locate_ip(buf, offset, end, linktype):
+    """Возвращает (ethertype, offset) начала IP-заголовка или None."""
+    if linktype == LINKTYPE_ETHERNET:
+        if end - offset < 14:
+            return None
+        ethertype = U16.unpack_from(buf, offset + 12)[0]
+        offset += 14
+        while ethertype in ETHERTYPE_VLAN and end - offset >= 4:
+            ethertype = U16.unpack_from(buf, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype in (LINKTYPE_RAW, LINKTYPE_RAW_OPENBSD, LINKTYPE_RAW_ALT, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if end <= offset:
+            return None
+        version = buf[offset] >> 4
+        return (ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6 if version == 6 else 0), offset
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if end - offset < 4:
+            return None
+        family = (U32_BE if linktype == LINKTYPE_LOOP else U32_LE).unpack_from(buf, offset)[0]
+        if linktype == LINKTYPE_NULL and family > 0xFFFF:
+            family = U32_BE.unpack_from(buf, offset)[0]  # дамп снят на машине с другим порядком байтов
+        ethertype = ETHERTYPE_IPV4 if family == NULL_AF_INET else ETHERTYPE_IPV6 if family in NULL_AF_INET6 else 0
+        return ethertype, offset + 4
+    if linktype == LINKTYPE_LINUX_SLL:
+        if end - offset < 16:
+            return None
+        return U16.unpack_from(buf, offset + 14)[0], offset + 16
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if end - offset < 20:
+            return None
+        return U16.unpack_from(buf, offset)[0], offset + 20
+    return None
+
+
+def read_dns_name(buf, offset, end):
+    """Имя из секции вопросов в виде, как его показывает tshark; возвращает (name, offset)."""
+    labels = []
+    next_offset = None
+    jumps = 0
+    while offset < end:
+        length = buf[offset]
+        if length == 0:
+            offset += 1
+            break
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= end or jumps > 16:
+                return None, end
+            if next_offset is None:
+                next_offset = offset + 2
+            offset = ((length & 0x3F) << 8) | buf[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if offset + length > end:
+            return None, end
+        labels.append(buf[offset:offset + length].decode("ascii", "backslashreplace"))
+        offset += length
+    else:
+        return None, end
+    name = ".".join(labels) if labels else "<Root>"
+    return name, next_offset if next_offset is not None else offset
+
+
+def parse_dns_question(buf, start, end):
+    """(qry_name, qry_type, rcode) первого вопроса DNS-сообщения или None.
+
+    rcode — код ответа для ответов (бит QR) и NO_RCODE для запросов.
+    """
+    if end - start < 12:
+        return None
+    if U16.unpack_from(buf, start + 4)[0] == 0:
+        return None  # нет вопросов — у tshark не будет qry_name
+    # Указатели сжатия отсчитываются от начала сообщения, поэтому работаем
+    # с отдельным срезом, а не со смещениями в файле.
+    message = buf[start:end]
+    name, offset = read_dns_name(message, 12, len(message))
+    if not name or offset + 2 > len(message):
+        return None
+    flags = U16.unpack_from(message, 2)[0]
+    rcode = flags & 0x000F if flags & 0x8000 else NO_RCODE
+    return name, U16.unpack_from(message, offset)[0], rcode
+
+
+def decode_packet(buf, offset, caplen, linktype):
+    """Возвращает (src, dst, is_ipv4, dns) для пакета; None, если в нём нет IP.
+
+    src/dst — сырые байты адресов, dns — (qry_name, qry_type, rcode) или None.
+    """
+    end = offset + caplen
+    located = locate_ip(buf, offset, end, linktype)
+    if located is None:
+        return None
+    ethertype, offset = located
+
+    if ethertype == ETHERTYPE_IPV4:
+        if end - offset < 20:
+            return None
+        header_len = (buf[offset] & 0x0F) * 4
+        src = buf[offset + 12:offset + 16]
+        dst = buf[offset + 16:offset + 20]
+        is_ipv4 = True
+        protocol = buf[offset + 9]
+        fragment = U16.unpack_from(buf, offset + 6)[0]
+        total_len = U16.unpack_from(buf, offset + 2)[0]
+        if total_len >= header_len:
+            end = min(end, offset + total_len)  # отбрасываем паддинг Ethernet
+        if fragment & 0x3FFF:
+            return src, dst, is_ipv4, None
+        offset += header_len
+    elif ethertype == ETHERTYPE_IPV6:
+        if end - offset < 40:
+            return None
+        src = buf[offset + 8:offset + 24]
+        dst = buf[offset + 24:offset + 40]
+        is_ipv4 = False
+        protocol = buf[offset + 6]
+        payload_len = U16.unpack_from(buf, offset + 4)[0]
+        if payload_len:
+            end = min(end, offset + 40 + payload_len)
+        offset += 40
+        while protocol in IPV6_EXTENSION_HEADERS and end - offset >= 8:
+            protocol = buf[offset]
+            offset += (buf[offset + 1] + 1) * 8
+        if protocol == IPV6_FRAGMENT_HEADER:
+            return src, dst, is_ipv4, None
+    else:
+        return None
+
+    if protocol == IPPROTO_UDP:
+        if end - offset < 8:
+            return src, dst, is_ipv4, None
+        sport, dport = struct.unpack_from("!HH", buf, offset)
+        if sport != DNS_PORT and dport != DNS_PORT:
+            return src, dst, is_ipv4, None
+        return src, dst, is_ipv4, parse_dns_question(buf, offset + 8, end)
+
+    if protocol == IPPROTO_TCP:
+        if end - offset < 20:
+            return src, dst, is_ipv4, None
+        sport, dport = struct.unpack_from("!HH", buf, offset)
+        if sport != DNS_PORT and dport != DNS_PORT:
+            return src, dst, is_ipv4, None
+        payload = offset + (buf[offset + 12] >> 4) * 4
+        if end - payload < 2:
+            return src, dst, is_ipv4, None
+        message_len = U16.unpack_from(buf, payload)[0]
+        if payload + 2 + message_len > end:
+            return src, dst, is_ipv4, None
+        return src, dst, is_ipv4, parse_dns_question(buf, payload + 2, payload + 2 + message_len)
+
+    return src, dst, is_ipv4, None
+
+
+def may_be_dns(buf, offset, caplen, linktype):
+    """Дешёвая проверка по сырым байтам до decode_packet: UDP/TCP с портом 53.
+
+    Ничего не копирует и не создаёт объектов. Лишние «да» отсеет
+    decode_packet, а пакет, в котором decode_packet нашёл бы DNS,
+    здесь не отбрасывается.
+    """
+    end = offset + caplen
+    if linktype == LINKTYPE_ETHERNET and end - offset >= 34 and buf[offset + 12] == 0x08 and buf[offset + 13] == 0x00:
+        # Самый частый случай — Ethernet без VLAN и IPv4 — без locate_ip.
+        ip = offset + 14
+    else:
+        located = locate_ip(buf, offset, end, linktype)
+        if located is None:
+            return False
+        ethertype, ip = located
+        if ethertype == ETHERTYPE_IPV6:
+            if end - ip < 40:
+                return False
+            protocol = buf[ip + 6]
+            if protocol in IPV6_EXTENSION_HEADERS:
+                return True  # заголовки расширений разбирает decode_packet
+            if protocol != IPPROTO_UDP and protocol != IPPROTO_TCP:
+                return False
+            ports = ip + 40
+            return end - ports >= 4 and DNS_PORT in PORTS.unpack_from(buf, ports)
+        if ethertype != ETHERTYPE_IPV4 or end - ip < 20:
+            return False
+    if buf[ip + 9] != IPPROTO_UDP and buf[ip + 9] != IPPROTO_TCP:
+        return False
+    ports = ip + (buf[ip] & 0x0F) * 4
+    return end - ports >= 4 and DNS_PORT in PORTS.unpack_from(buf, ports)
+
+
+def format_ip(raw):
+    return socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+
+
+# ==========================
+#  Извлечение DNS-запросов
+# ==========================
+def decode_shard(task, writer=None, resume=None):
+    """Разбирает кусок дампа [start, end); выполняется и в дочерних процессах.
+
+    Возвращает (store, raw_ips, packet_count): DnsRecordStore с записями
+    в порядке файла и сырые адреса всех IP-пакетов.
+
+    С writer (DnsStreamWriter) записи и новые IP сразу уходят в выходные
+    файлы, а каждые CHECKPOINT_EVERY пакетов сохраняется точка
+    восстановления. resume — результат writer.resume(): с него разбор
+    продолжается.
+
+    dns_only — пакеты без UDP/TCP-порта 53 отбрасываются проверкой
+    may_be_dns ещё до разбора, а IP собираются только из DNS-пакетов.
+    """
+    pcap_file, start, end, section, progress, resolutions, dns_only = task
+    store = DnsRecordStore(resolutions)
+    raw_ips = set()
+    packet_count = 0
+    if resume is not None:
+        start, section, packet_count, store, ip_names = resume
+        raw_ips.update(ip_names)
+        print(f"[*] Продолжаем с пакета {packet_count + 1} (записей уже: {len(store)})")
+
+    with open(pcap_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if writer is not None and is_pcapng(buf) and section is None:
+            # Для восстановления нужно знать интерфейсы; в дампе из нескольких
+            # секций их не вычислить без чтения с начала — точки не ставим.
+            first = pcapng_first_section(buf)
+            section = (first[0], tuple(first[1])) if first is not None else None
+            checkpoints = first is not None
+        else:
+            checkpoints = writer is not None
+
+        position = start if start is not None else (0 if is_pcapng(buf) else 24)
+        for timestamp, linktype, offset, caplen, next_offset in iter_capture_records(buf, start, end, section):
+            if checkpoints and packet_count and packet_count % CHECKPOINT_EVERY == 0:
+                writer.checkpoint(pcap_file, position, section, packet_count)
+            position = next_offset
+            packet_count += 1
+            if progress and packet_count % PROGRESS_EVERY == 0:
+                print(f"   Обработано пакетов: {packet_count}")
+
+            if dns_only and not may_be_dns(buf, offset, caplen, linktype):
+                continue
+            decoded = decode_packet(buf, offset, caplen, linktype)
+            if decoded is None:
+                continue
+            src, dst, is_ipv4, dns = decoded
+            if dns_only and dns is None:
+                continue
+            for raw in (src, dst):
+                if raw not in raw_ips:
+                    raw_ips.add(raw)
+                    if writer is not None:
+                        writer.add_ip(raw)
+            if dns is None:
+                continue
+
+            if is_ipv4:
+                src, dst = int.from_bytes(src, "big"), int.from_bytes(dst, "big")
+            else:
+                src = dst = NO_IP
+            store.append(timestamp, src, dst, dns[0], dns[1], dns[2])
+            if writer is not None:
+                writer.write_record(timestamp, src, dst, dns[0], dns[1], dns[2])
+    return store, raw_ips, packet_count
+
+
+def plan_tasks(pcap_files, workers, resolutions=DEFAULT_RESOLUTIONS, dns_only=False):
+    """Задачи для decode_shard: файлы целиком или их шарды, если файлов меньше, чем процессов."""
+    tasks = []
+    shards_per_file = max(1, workers // len(pcap_files))
+    for pcap_file in pcap_files:
+        if shards_per_file == 1:
+            tasks.append((pcap_file, None, None, None, workers == 1, resolutions, dns_only))
+            continue
+        with open(pcap_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for start, end, section in plan_shards(buf, shards_per_file):
+                tasks.append((pcap_file, start, end, section, False, resolutions, dns_only))
+    return tasks
+
+
+def extract_dns_native(
+    pcap_files,
+    workers=1,
+    writer=None,
+    resume=False,
+    resolutions=DEFAULT_RESOLUTIONS,
+    dns_only=False,
+):
+    """Аналог extract_dns_requests: возвращает (DnsRecordStore, all_ips).
+
+    Принимает один файл или список. При workers > 1 файлы (или шарды одного
+    файла) разбираются в пуле процессов. Шарды одного файла склеиваются
+    в исходном порядке, записи разных файлов упорядочиваются по времени
+    (при равном времени — в порядке файлов), так что результат не зависит
+    от числа процессов.
+
+    writer (DnsStreamWriter) получает записи: для одного файла в один
+    процесс — по ходу разбора, с точками восстановления (resume=True
+    продолжает прерванный запуск), иначе — после склейки шардов.
+
+    resolutions — разрешения счётчика dns_records.timeline в секундах.
+    dns_only=True — не-DNS пакеты отбрасываются по сырым байтам (см.
+    may_be_dns), all_ips тогда содержит только адреса DNS-пакетов.
+    """
+    if isinstance(pcap_files, (str, os.PathLike)):
+        pcap_files = [pcap_files]
+    pcap_files = [os.fspath(path) for path in pcap_files]
+
+    for pcap_file in pcap_files:
+        print(f"[*] Открываем файл (встроенный разборщик): {pcap_file}")
+    tasks = plan_tasks(pcap_files, max(1, workers), resolutions, dns_only)
+    streaming = writer is not None and len(tasks) == 1
+    if streaming:
+        state = None
+        if resume:
+            state = writer.resume(pcap_files[0], resolutions)
+        else:
+            writer.open()
+        results = [decode_shard(tasks[0], writer, state)]
+    elif workers > 1 and len(tasks) > 1:
+        print(f"[*] Процессов: {workers}, частей дампа: {len(tasks)}")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(decode_shard, tasks))
+    else:
+        results = [decode_shard(task) for task in tasks]
+
+    # Задачи идут по файлам и внутри файла по порядку шардов,
+    # поэтому простая склейка сохраняет порядок пакетов в каждом файле.
+    dns_records = DnsRecordStore(resolutions)
+    raw_ips = set()
+    packet_count = 0
+    for store, shard_ips, shard_packets in results:
+        dns_records.extend(store)
+        raw_ips |= shard_ips
+        packet_count += shard_packets
+
+    if len(pcap_files) > 1:
+        # Устойчивая сортировка: при равном времени остаётся порядок файлов.
+        times = dns_records.column("times")
+        order = np.argsort(np.where(np.isnan(times), -np.inf, times), kind="stable")
+        dns_records = dns_records.take(order)
+
+    if writer is not None and not streaming:
+        writer.open()
+        writer.write_store(dns_records)
+        for raw in raw_ips:
+            writer.add_ip(raw)
+
+    all_ips = {format_ip(raw) for raw in raw_ips}
+    print(f"[+] Всего пакетов: {packet_count}")
+    print(f"[+] Найдено DNS-запросов: {len(dns_records)}")
+    print(f"[+] Уникальных IP-адресов: {len(all_ips)}")
+    return dns_records, all_ips
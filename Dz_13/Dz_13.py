@@ -13,6 +13,12 @@
   python vt_client.py 8.8.8.8
   python vt_client.py google.com
   python vt_client.py --type file --id <hash> --out out.json
+  python vt_client.py 8.8.8.8 --cache vt_cache.sqlite3
+
+Кэш (--cache) — общий с итоговым заданием модуль vt_cache:
+  pip install -e ../shared
+  python vt_client.py --batch indicators.txt --batch-out results.ndjson
+  cat indicators.txt | python vt_client.py --batch - --workers 8 --rate 500
 """
 
 from __future__ import annotations
@@ -22,19 +28,39 @@ import base64
 import datetime as dt
 import json
 import os
+import queue
 import re
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from urllib.parse import urlsplit, urlunsplit
 
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import vt_cache
+except ImportError:  # кэш нужен только с --cache
+    vt_cache = None
 
 VT_BASE = "https://www.virustotal.com/api/v3"
 
+# Публичный ключ VT: 4 запроса в минуту. Для платного ключа поднимите --rate.
+DEFAULT_RATE_PER_MINUTE = 4
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 2
+# Как часто батч забирает готовые ответы, пока вход (stdin) молчит, сек.
+BATCH_DRAIN_INTERVAL = 0.2
+
 
 HASH_RE = re.compile(r"^[A-Fa-f0-9]{32}$|^[A-Fa-f0-9]{40}$|^[A-Fa-f0-9]{64}$")
 IP_RE = re.compile(r"^(?:\d{1,3}\.){3}\d{1,3}$")
 SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+\-.]*://")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+HASH_FIELDS = ("md5", "sha1", "sha256")
 
 
 def url_to_id(url: str) -> str:
@@ -62,6 +88,96 @@ def detect_indicator(value: str) -> Tuple[str, str]:
     return "domain", v.lower()
 
 
+class VTHTTPError(RuntimeError):
+    def __init__(self, message: str, status_code: int, body: Optional[Dict[str, Any]] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class RateLimiter:
+    """Равномерно распределяет запросы: не чаще per_minute в минуту на все потоки."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def make_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def canonicalize_domain(domain: str) -> str:
+    return domain.strip().rstrip(".").lower()
+
+
+def canonicalize_url(url: str) -> str:
+    """Приводит URL к одному виду: схема и хост в нижнем регистре,
+    без порта по умолчанию, фрагмента и завершающего слэша в пути."""
+    value = url.strip()
+    if not SCHEME_RE.match(value):
+        value = "http://" + value
+    parts = urlsplit(value)
+    scheme = parts.scheme.lower()
+    host = canonicalize_domain(parts.hostname or "")
+    if ":" in host:
+        # IPv6-адрес в URL пишется только в квадратных скобках.
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{port}"
+    if parts.username or parts.password:
+        netloc = parts.netloc.rsplit("@", 1)[0] + "@" + netloc
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, netloc, path, parts.query, ""))
+
+
+def query_indicator(value: str, kind: str = "auto") -> Tuple[str, str]:
+    """Тип и значение для запроса к VT — в том виде, как его ввели."""
+    if kind == "auto":
+        return detect_indicator(value)
+    return kind, value.strip()
+
+
+def canonicalize_indicator(kind: str, value: str) -> str:
+    """Ключ для дедупликации и кэша: одинаковые по смыслу строки дают один ключ.
+
+    В VT уходит исходное значение: id URL в VT — хэш точной строки,
+    и канонизированный URL может оказаться ему неизвестен.
+    """
+    if kind == "url":
+        return canonicalize_url(value)
+    if kind == "domain":
+        return canonicalize_domain(value)
+    if kind == "file":
+        return value.lower()
+    return value
+
+
+def file_hash_aliases(resp: Dict[str, Any]) -> List[str]:
+    """MD5/SHA1/SHA256 из ответа /files — любой из них указывает на тот же отчёт."""
+    data = resp.get("data", {})
+    attrs = data.get("attributes", {}) if isinstance(data, dict) else {}
+    return [str(attrs[k]).lower() for k in HASH_FIELDS if attrs.get(k)]
+
+
 def vt_get(session: requests.Session, api_key: str, endpoint: str) -> Dict[str, Any]:
     url = f"{VT_BASE}{endpoint}"
     headers = {"x-apikey": api_key, "accept": "application/json"}
@@ -70,12 +186,13 @@ def vt_get(session: requests.Session, api_key: str, endpoint: str) -> Dict[str,
     # Удобное сообщение об ошибке в формате VT (обычно JSON)
     if r.status_code != 200:
         msg = f"VirusTotal API вернул {r.status_code}."
+        err = None
         try:
             err = r.json()
             msg += f" Ответ: {json.dumps(err, ensure_ascii=False)}"
         except Exception:
             msg += f" Ответ: {r.text}"
-        raise RuntimeError(msg)
+        raise VTHTTPError(msg, r.status_code, err if isinstance(err, dict) else None)
 
     return r.json()
 
@@ -146,6 +263,230 @@ def build_endpoint(kind: str, indicator: str) -> str:
     raise ValueError(f"Неизвестный тип: {kind}")
 
 
+def open_vt_cache(path: str) -> Any:
+    if vt_cache is None:
+        raise RuntimeError("Для --cache нужен общий модуль vt_cache: pip install -e ../shared")
+    return vt_cache.VTCache(path)
+
+
+def cache_get(cache: Any, kind: str, key: str) -> Optional[Dict[str, Any]]:
+    """Ответ из кэша; сохранённый 404 поднимается как VTHTTPError, как и живой."""
+    resp = cache.get(kind, key)
+    if resp is not None and vt_cache.is_not_found(resp):
+        raise VTHTTPError(
+            f"VirusTotal API вернул 404 (из кэша). Ответ: {json.dumps(resp, ensure_ascii=False)}",
+            404,
+            resp,
+        )
+    return resp
+
+
+def cache_put_error(cache: Any, kind: str, key: str, error: BaseException) -> None:
+    # Кэшируется только 404: остальные ошибки (квота, сеть) стоит повторить.
+    if isinstance(error, VTHTTPError) and error.status_code == 404:
+        cache.put(kind, key, "not_found", error.body or vt_cache.not_found_payload(str(error)))
+
+
+def iter_indicators(stream: TextIO) -> Iterator[str]:
+    """Строки входного файла; пустые и комментарии (#) пропускаются."""
+    for line in stream:
+        value = line.strip()
+        if value and not value.startswith("#"):
+            yield value
+
+
+_END_OF_INPUT = object()
+
+
+def start_reader(indicators: Iterable[str], maxsize: int) -> Tuple["queue.Queue[Any]", List[BaseException]]:
+    """Читает индикаторы в отдельном потоке, чтобы медленный вход не задерживал вывод.
+
+    Очередь ограничена, так что вход по-прежнему читается не дальше, чем
+    успевает обработка. Ошибка чтения попадает в список и пробрасывается
+    вызывающим после _END_OF_INPUT.
+    """
+    lines: "queue.Queue[Any]" = queue.Queue(maxsize=maxsize)
+    errors: List[BaseException] = []
+
+    def read() -> None:
+        try:
+            for original in indicators:
+                lines.put(original)
+        except BaseException as exc:
+            errors.append(exc)
+        finally:
+            lines.put(_END_OF_INPUT)
+
+    threading.Thread(target=read, name="batch-reader", daemon=True).start()
+    return lines, errors
+
+
+def lookup(
+    session: requests.Session,
+    api_key: str,
+    kind: str,
+    norm: str,
+    limiter: RateLimiter,
+    retries: int = DEFAULT_RETRIES,
+) -> Dict[str, Any]:
+    endpoint = build_endpoint(kind, norm)
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            return vt_get(session, api_key, endpoint)
+        except VTHTTPError as exc:
+            # 429 — превышена квота: ждём и повторяем, остальные коды не лечатся повтором.
+            if exc.status_code != 429 or attempt == retries:
+                raise
+        except requests.RequestException:
+            if attempt == retries:
+                raise
+        time.sleep(max(limiter.interval, 2.0 ** attempt))
+    raise RuntimeError("unreachable")
+
+
+def batch_record(
+    original: str,
+    kind: str,
+    norm: str,
+    resp: Optional[Dict[str, Any]] = None,
+    error: Optional[BaseException] = None,
+    source: str = "api",
+) -> Dict[str, Any]:
+    record: Dict[str, Any] = {"input": original, "type": kind, "indicator": norm}
+    if error is not None:
+        record["status"] = "error"
+        record["error"] = str(error)
+        if isinstance(error, VTHTTPError):
+            record["http_status"] = error.status_code
+    else:
+        record["status"] = "ok"
+        record["response"] = resp
+    # api — свой запрос, cache — SQLite-кэш, reused — ответ на такой же
+    # (после нормализации) или тот же файл под другим хэшем.
+    record["source"] = source
+    return record
+
+
+def run_batch(
+    indicators: Iterable[str],
+    api_key: str,
+    out: TextIO,
+    kind_override: str = "auto",
+    workers: int = DEFAULT_WORKERS,
+    rate_per_minute: float = DEFAULT_RATE_PER_MINUTE,
+    cache: Any = None,
+) -> Dict[str, int]:
+    """Проверяет индикаторы параллельно и пишет NDJSON по мере готовности ответов.
+
+    Индикаторы нормализуются, и на каждый уникальный ключ уходит не больше
+    одного запроса: дубликаты ждут его ответа, а для файлов ответ
+    регистрируется под всеми тремя хэшами. Каждая входная строка всё равно
+    получает свою запись в выводе.
+
+    В полёте держится не больше workers * 4 запросов, поэтому вход
+    (в т.ч. stdin) читается постепенно. Вход читает отдельный поток, а
+    готовые ответы выводятся не реже BATCH_DRAIN_INTERVAL, даже если новых
+    строк нет. Кэш трогаем только из этого потока: sqlite3-соединение нельзя
+    делить между потоками.
+    """
+    counts = {"ok": 0, "error": 0, "cached": 0, "reused": 0, "requests": 0}
+    limiter = RateLimiter(rate_per_minute)
+    max_in_flight = max(1, workers) * 4
+
+    Key = Tuple[str, str]
+    pending: Dict[Future, Key] = {}
+    waiting: Dict[Key, List[str]] = {}
+    resolved: Dict[Key, Tuple[Optional[Dict[str, Any]], Optional[BaseException]]] = {}
+
+    def emit(record: Dict[str, Any]) -> None:
+        counts[record["status"]] += 1
+        if record["source"] == "cache":
+            counts["cached"] += 1
+        elif record["source"] == "reused":
+            counts["reused"] += 1
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    def resolve(key: Key, resp: Optional[Dict[str, Any]], error: Optional[BaseException]) -> None:
+        resolved[key] = (resp, error)
+        if resp is None or key[0] != "file":
+            return
+        for alias in file_hash_aliases(resp):
+            alias_key = ("file", alias)
+            if alias_key not in resolved:
+                resolved[alias_key] = (resp, None)
+                if cache:
+                    cache.put("file", alias, "ok", resp)
+
+    def collect(done: Iterable[Future]) -> None:
+        for future in done:
+            key = pending.pop(future)
+            try:
+                resp, error = future.result(), None
+            except Exception as exc:
+                resp, error = None, exc
+            if cache:
+                if resp is not None:
+                    cache.put(key[0], key[1], "ok", resp)
+                else:
+                    cache_put_error(cache, key[0], key[1], error)
+            resolve(key, resp, error)
+            for index, original in enumerate(waiting.pop(key)):
+                emit(batch_record(original, *key, resp, error, "api" if index == 0 else "reused"))
+
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        lines, read_errors = start_reader(indicators, max_in_flight)
+        while True:
+            try:
+                original = lines.get(timeout=BATCH_DRAIN_INTERVAL if pending else None)
+            except queue.Empty:
+                # Входа пока нет — выводим то, что уже готово.
+                collect([future for future in pending if future.done()])
+                continue
+            if original is _END_OF_INPUT:
+                break
+            kind, query = query_indicator(original, kind_override)
+            key = (kind, canonicalize_indicator(kind, query))
+            # Забираем уже готовые ответы: они могли зарегистрировать хэш-алиасы.
+            collect([future for future in pending if future.done()])
+
+            if key in resolved:
+                emit(batch_record(original, *key, *resolved[key], source="reused"))
+                continue
+            if key in waiting:
+                waiting[key].append(original)
+                continue
+
+            try:
+                resp = cache_get(cache, *key) if cache else None
+            except VTHTTPError as exc:
+                resolve(key, None, exc)
+                emit(batch_record(original, *key, error=exc, source="cache"))
+                continue
+            if resp is not None:
+                resolve(key, resp, None)
+                emit(batch_record(original, *key, resp, source="cache"))
+                continue
+
+            while len(pending) >= max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            # Запрос строится по первому вводу с этим ключом, а не по ключу.
+            future = pool.submit(lookup, session, api_key, kind, query, limiter)
+            pending[future] = key
+            waiting[key] = [original]
+            counts["requests"] += 1
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        if read_errors:
+            raise read_errors[0]
+
+    return counts
+
+
 def make_default_outfile(kind: str, indicator: str) -> Path:
     safe = re.sub(r"[^A-Za-z0-9_.-]+", "_", indicator)[:60]
     stamp = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -159,6 +500,16 @@ def main() -> int:
     parser.add_argument("--id", dest="explicit_id", help="Индикатор, если не хотите передавать позиционно")
     parser.add_argument("--out", default=None, help="Путь к JSON-файлу результата (по умолчанию создаётся автоматически)")
     parser.add_argument("--raw", action="store_true", help="Печатать полный JSON в консоль")
+    parser.add_argument("--cache", default=None, help="SQLite-кэш ответов VT (общий с итоговым заданием)")
+    parser.add_argument("--batch", default=None, help="Файл с индикаторами по одному на строку ('-' — stdin)")
+    parser.add_argument("--batch-out", default=None, help="Куда писать NDJSON в пакетном режиме (по умолчанию stdout)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Параллельных запросов в пакетном режиме")
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=DEFAULT_RATE_PER_MINUTE,
+        help="Не больше N запросов в минуту (0 — без ограничения)",
+    )
     args = parser.parse_args()
 
     api_key = os.getenv("VT_API_KEY")
@@ -166,20 +517,37 @@ def main() -> int:
         print("Ошибка: переменная окружения VT_API_KEY не задана.", file=sys.stderr)
         return 2
 
+    if args.batch:
+        return main_batch(args, api_key)
+
     indicator = args.explicit_id or args.indicator
     if not indicator:
         parser.print_help()
         return 2
 
-    if args.type == "auto":
-        kind, norm = detect_indicator(indicator)
-    else:
-        kind, norm = args.type, indicator.strip()
+    kind, norm = query_indicator(indicator, args.type)
+    cache_key = canonicalize_indicator(kind, norm)
 
     endpoint = build_endpoint(kind, norm)
 
-    with requests.Session() as session:
-        resp = vt_get(session, api_key, endpoint)
+    cache = open_vt_cache(args.cache) if args.cache else None
+    try:
+        resp = cache_get(cache, kind, cache_key) if cache else None
+        if resp is None:
+            with requests.Session() as session:
+                try:
+                    resp = vt_get(session, api_key, endpoint)
+                except VTHTTPError as exc:
+                    if cache:
+                        cache_put_error(cache, kind, cache_key, exc)
+                    raise
+            if cache:
+                cache.put(kind, cache_key, "ok", resp)
+        else:
+            print("(ответ взят из кэша)")
+    finally:
+        if cache:
+            cache.close()
 
     summarize(kind, resp, indicator)
 
@@ -194,5 +562,35 @@ def main() -> int:
     return 0
 
 
+def main_batch(args: argparse.Namespace, api_key: str) -> int:
+    source = sys.stdin if args.batch == "-" else open(args.batch, "r", encoding="utf-8")
+    out = open(args.batch_out, "w", encoding="utf-8") if args.batch_out else sys.stdout
+    cache = open_vt_cache(args.cache) if args.cache else None
+    try:
+        counts = run_batch(
+            iter_indicators(source),
+            api_key,
+            out,
+            kind_override=args.type,
+            workers=args.workers,
+            rate_per_minute=args.rate,
+            cache=cache,
+        )
+    finally:
+        if cache:
+            cache.close()
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+
+    print(
+        f"Готово: ok={counts['ok']}, ошибок={counts['error']}; запросов к API: {counts['requests']}, "
+        f"из кэша: {counts['cached']}, повторно использовано: {counts['reused']}",
+        file=sys.stderr,
+    )
+    return 0 if counts["error"] == 0 else 1
+
+
 if __name__ == "__main__":
     raise SystemExit(main())
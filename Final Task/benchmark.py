@@ -0,0 +1,540 @@
+"""
+Бенчмарки итогового задания.
+
+Запуск:
+  python benchmark.py reports --rows 1000000
+  python benchmark.py reports --rows 100000 --formats csv parquet --output bench_reports.json
+  python benchmark.py generate corpus.json --events 1m --distinct-ips 50000
+  python benchmark.py pipeline --sizes 10k 1m 10m --output bench_pipeline.json
+  python benchmark.py compare bench_old.json bench_new.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import ipaddress
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, TextIO
+
+import numpy as np
+import pandas as pd
+
+import main as pipeline
+from stage_metrics import PipelineProfiler
+
+DEFAULT_REPORT_ROWS = 1_000_000
+DEFAULT_SEED = 42
+
+# Версия формата JSON с результатами: меняется только при несовместимых правках,
+# чтобы результаты разных прогонов можно было сравнивать командой compare.
+RESULTS_SCHEMA_VERSION = 1
+
+DEFAULT_PIPELINE_SIZES = ["10k", "1m", "10m"]
+DEFAULT_DISTINCT_IPS = 5_000
+DEFAULT_SIGNATURES = 300
+DEFAULT_GLOBAL_RATIO = 0.3
+DEFAULT_NON_ALERT_RATIO = 0.0
+GENERATOR_BATCH = 100_000
+CORPUS_START = pd.Timestamp("2018-03-20T00:00:00", tz="UTC")
+
+
+def parse_size(value: str) -> int:
+    """10k, 1m, 10M, 2500 -> число событий."""
+    value = value.strip().lower().replace("_", "")
+    multiplier = 1
+    if value[-1:] in {"k", "m"}:
+        multiplier = 1_000 if value[-1] == "k" else 1_000_000
+        value = value[:-1]
+    try:
+        return int(float(value) * multiplier)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"Некорректный размер: {value!r}") from exc
+
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def make_ip_pools(distinct_ips: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    """Пул внешних адресов заданного размера и пул локальных адресов 10.0.0.0/8."""
+    global_ips: List[str] = []
+    seen = set()
+    while len(global_ips) < distinct_ips:
+        for value in rng.integers(0x01000000, 0xDF000000, size=distinct_ips * 2):
+            address = ipaddress.IPv4Address(int(value))
+            if address.is_global and value not in seen:
+                seen.add(value)
+                global_ips.append(str(address))
+                if len(global_ips) == distinct_ips:
+                    break
+
+    local_count = max(1, distinct_ips // 4)
+    local_values = 0x0A000000 + rng.choice(0xFFFFFF, size=local_count, replace=False)
+    local_ips = [str(ipaddress.IPv4Address(int(value))) for value in local_values]
+    return {
+        "global": np.array(global_ips, dtype=object),
+        "local": np.array(local_ips, dtype=object),
+    }
+
+
+def write_alert_corpus(
+    handle: TextIO,
+    events: int,
+    distinct_ips: int = DEFAULT_DISTINCT_IPS,
+    signatures: int = DEFAULT_SIGNATURES,
+    global_ratio: float = DEFAULT_GLOBAL_RATIO,
+    non_alert_ratio: float = DEFAULT_NON_ALERT_RATIO,
+    seed: int = DEFAULT_SEED,
+) -> int:
+    """Пишет синтетический eve.json (NDJSON) порциями, не держа корпус в памяти.
+
+    global_ratio — доля внешних адресов среди src/dest, non_alert_ratio — доля
+    событий других типов (flow), которые читатель должен отбросить.
+    Возвращает число записанных alert-событий.
+    """
+    rng = np.random.default_rng(seed)
+    pools = make_ip_pools(distinct_ips, rng)
+    signature_names = np.array(
+        [f"ET SYNTHETIC Signature {index:05d}" for index in range(signatures)], dtype=object
+    )
+    categories = np.array([f"Synthetic Category {index:02d}" for index in range(20)], dtype=object)
+    protos = np.array(["TCP", "UDP", "ICMP"], dtype=object)
+    actions = np.array(["allowed", "blocked"], dtype=object)
+    # Популярность сигнатур по закону Ципфа, как в реальных правилах ET.
+    signature_weights = 1.0 / np.arange(1, signatures + 1)
+    signature_weights /= signature_weights.sum()
+
+    alerts_written = 0
+    for start in range(0, events, GENERATOR_BATCH):
+        size = min(GENERATOR_BATCH, events - start)
+
+        def endpoints() -> np.ndarray:
+            is_global = rng.random(size) < global_ratio
+            result = pools["local"][rng.integers(0, len(pools["local"]), size)]
+            result[is_global] = pools["global"][rng.integers(0, len(pools["global"]), is_global.sum())]
+            return result
+
+        src_ips = endpoints()
+        dest_ips = endpoints()
+        offsets = np.sort(rng.integers(0, 86_400_000_000, size))
+        timestamps = (CORPUS_START + pd.to_timedelta(offsets, unit="us")).strftime(
+            "%Y-%m-%dT%H:%M:%S.%f+0000"
+        )
+        signature_ids = rng.choice(signatures, size=size, p=signature_weights)
+        is_alert = rng.random(size) >= non_alert_ratio
+        src_ports = rng.integers(1024, 65535, size)
+        dest_ports = rng.choice(np.array([22, 53, 80, 443, 445, 3389]), size)
+        severities = rng.integers(1, 4, size)
+        category_ids = signature_ids % len(categories)
+        proto_ids = rng.integers(0, len(protos), size)
+        action_ids = (rng.random(size) < 0.1).astype(int)
+
+        lines: List[str] = []
+        for index in range(size):
+            common = (
+                f'"timestamp":"{timestamps[index]}","src_ip":"{src_ips[index]}",'
+                f'"src_port":{src_ports[index]},"dest_ip":"{dest_ips[index]}",'
+                f'"dest_port":{dest_ports[index]},"proto":"{protos[proto_ids[index]]}"'
+            )
+            if not is_alert[index]:
+                lines.append(f'{{"event_type":"flow",{common}}}\n')
+                continue
+            lines.append(
+                f'{{"event_type":"alert",{common},"alert":{{'
+                f'"action":"{actions[action_ids[index]]}",'
+                f'"signature":"{signature_names[signature_ids[index]]}",'
+                f'"category":"{categories[category_ids[index]]}",'
+                f'"severity":{severities[index]}}}}}\n'
+            )
+        handle.writelines(lines)
+        alerts_written += int(is_alert.sum())
+    return alerts_written
+
+
+def generate_corpus(path: Path, events: int, **params: Any) -> int:
+    with path.open("w", encoding="utf-8") as handle:
+        return write_alert_corpus(handle, events, **params)
+
+
+def make_synthetic_report(rows: int, seed: int = DEFAULT_SEED) -> pd.DataFrame:
+    """Отчёт той же структуры, что выдаёт add_risk_metrics."""
+    rng = np.random.default_rng(seed)
+    octets = rng.integers(1, 255, size=(rows, 4))
+    ips = [f"{a}.{b}.{c}.{d}" for a, b, c, d in octets]
+    signatures = np.array([f"ET POLICY Synthetic signature {i}" for i in range(500)], dtype=object)
+    categories = np.array([f"Category {i}" for i in range(40)], dtype=object)
+    countries = np.array(["US", "DE", "FR", "NL", "RU", "CN", "BR", ""], dtype=object)
+
+    first_seen = pd.Timestamp("2018-03-20", tz="UTC") + pd.to_timedelta(
+        rng.integers(0, 7 * 86_400, rows), unit="s"
+    )
+    last_seen = first_seen + pd.to_timedelta(rng.integers(0, 86_400, rows), unit="s")
+    risk_score = np.round(rng.gamma(2.0, 15.0, rows), 2)
+
+    return pd.DataFrame(
+        {
+            "ip": ips,
+            "alert_count": rng.integers(1, 500, rows),
+            "directions": rng.choice(np.array(["inbound", "outbound", "inbound, outbound"], dtype=object), rows),
+            "unique_signatures": rng.integers(1, 20, rows),
+            "unique_categories": rng.integers(1, 8, rows),
+            "critical_severity": rng.integers(1, 4, rows),
+            "top_signature": rng.choice(signatures, rows),
+            "top_category": rng.choice(categories, rows),
+            "top_local_peers": [f"10.0.{a % 256}.{b % 256}" for a, b in octets[:, :2]],
+            "first_seen": first_seen,
+            "last_seen": last_seen,
+            "vt_lookup_status": rng.choice(np.array(["ok", "skipped", "not_found"], dtype=object), rows),
+            "vt_malicious": rng.integers(0, 10, rows).astype(float),
+            "vt_suspicious": rng.integers(0, 5, rows).astype(float),
+            "vt_harmless": rng.integers(0, 70, rows).astype(float),
+            "vt_undetected": rng.integers(0, 70, rows).astype(float),
+            "vt_reputation": rng.integers(-50, 10, rows).astype(float),
+            "vt_country": rng.choice(countries, rows),
+            "vt_as_owner": "",
+            "vt_network": "",
+            "vt_tags": "",
+            "vt_error": "",
+            "risk_score": risk_score,
+            "risk_level": np.select(
+                [
+                    risk_score >= pipeline.RISK_HIGH_THRESHOLD,
+                    risk_score >= pipeline.RISK_MEDIUM_THRESHOLD,
+                ],
+                ["high", "medium"],
+                default="low",
+            ),
+        }
+    )
+
+
+def path_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+    return path.stat().st_size
+
+
+def bench_report_writers(
+    report_df: pd.DataFrame,
+    formats: List[str],
+    partition_by_date: bool = False,
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for report_format in formats:
+            extension = "parquet" if report_format == "parquet" else report_format
+            report_path = Path(tmp_dir) / f"report.{extension}"
+
+            started = time.perf_counter()
+            pipeline.save_report(
+                report_df,
+                str(report_path),
+                report_format=report_format,
+                partition_by_date=partition_by_date,
+            )
+            elapsed = time.perf_counter() - started
+
+            written = report_path.parent / report_path.stem if partition_by_date else report_path
+            results.append(
+                {
+                    "format": report_format,
+                    "seconds": round(elapsed, 4),
+                    "bytes": path_size(written),
+                }
+            )
+    return results
+
+
+def run_reports(args: argparse.Namespace) -> Dict[str, Any]:
+    report_df = make_synthetic_report(args.rows, seed=args.seed)
+    results = bench_report_writers(report_df, args.formats, args.partition_by_date)
+
+    csv_result = next((item for item in results if item["format"] == "csv"), None)
+    print(f"Строк в отчёте: {args.rows}")
+    print(f"{'format':<10}{'seconds':>10}{'MiB':>10}{'vs csv time':>14}{'vs csv size':>14}")
+    for item in results:
+        time_ratio = size_ratio = ""
+        if csv_result is not None and item is not csv_result:
+            time_ratio = f"x{csv_result['seconds'] / max(item['seconds'], 1e-9):.1f}"
+            size_ratio = f"x{csv_result['bytes'] / max(item['bytes'], 1):.1f}"
+        print(
+            f"{item['format']:<10}{item['seconds']:>10.2f}{item['bytes'] / 2**20:>10.1f}"
+            f"{time_ratio:>14}{size_ratio:>14}"
+        )
+
+    return {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "benchmark": "report_writers",
+        "environment": environment_info(),
+        "rows": args.rows,
+        "seed": args.seed,
+        "partition_by_date": args.partition_by_date,
+        "results": results,
+    }
+
+
+def corpus_params(args: argparse.Namespace) -> Dict[str, Any]:
+    return {
+        "distinct_ips": args.distinct_ips,
+        "signatures": args.signatures,
+        "global_ratio": args.global_ratio,
+        "non_alert_ratio": args.non_alert_ratio,
+        "seed": args.seed,
+    }
+
+
+def run_generate(args: argparse.Namespace) -> Dict[str, Any]:
+    started = time.perf_counter()
+    alerts = generate_corpus(Path(args.path), args.events, **corpus_params(args))
+    elapsed = time.perf_counter() - started
+    print(f"Записано событий: {args.events} (alert: {alerts}) в {args.path} за {elapsed:.1f} с")
+    return {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "benchmark": "generate",
+        "events": args.events,
+        "alerts": alerts,
+        "params": corpus_params(args),
+        "seconds": round(elapsed, 4),
+    }
+
+
+def bench_pipeline(corpus_path: Path, top_ip_count: int) -> List[Dict[str, Any]]:
+    """Прогоняет функции пайплайна от чтения до add_risk_metrics с mock VT."""
+    profiler = PipelineProfiler()
+
+    with profiler.stage("read_suricata_alerts") as stage:
+        alerts_df = pipeline.read_suricata_alerts(str(corpus_path))
+        stage.rows_out = len(alerts_df)
+    alert_rows = len(alerts_df)
+    with profiler.stage("extract_candidate_ips", rows_in=alert_rows) as stage:
+        candidate_df = pipeline.extract_candidate_ips(alerts_df)
+        stage.rows_out = len(candidate_df)
+    del alerts_df
+    with profiler.stage("summarize_candidates", rows_in=len(candidate_df)) as stage:
+        summary_df = pipeline.summarize_candidates(candidate_df)
+        stage.rows_out = len(summary_df)
+    del candidate_df
+    # Тот же путь целиком, как его выполняет main(): порциями с агрегацией на лету.
+    with profiler.stage("summarize_log_files", rows_in=alert_rows) as stage:
+        stage.rows_out = len(pipeline.summarize_log_files([corpus_path], workers=1))
+    with profiler.stage("enrich_with_virustotal", rows_in=len(summary_df)) as stage:
+        enriched_df = pipeline.enrich_with_virustotal(
+            summary_df=summary_df,
+            api_key="",
+            top_ip_count=top_ip_count,
+            timeout=pipeline.DEFAULT_VT_TIMEOUT,
+            sleep_seconds=0.0,
+            use_mock_vt=True,
+            retries=0,
+            retry_delay=0.0,
+        )
+        stage.rows_out = len(enriched_df)
+    with profiler.stage("add_risk_metrics", rows_in=len(enriched_df)) as stage:
+        result_df = pipeline.add_risk_metrics(enriched_df)
+        stage.rows_out = len(result_df)
+
+    return profiler.to_dict()["stages"]
+
+
+def run_pipeline(args: argparse.Namespace) -> Dict[str, Any]:
+    runs: List[Dict[str, Any]] = []
+    data_dir = Path(args.data_dir) if args.data_dir else None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for events in args.sizes:
+            corpus_dir = data_dir or Path(tmp_dir)
+            corpus_dir.mkdir(parents=True, exist_ok=True)
+            params = corpus_params(args)
+            corpus_path = corpus_dir / (
+                f"synthetic_{events}_{args.distinct_ips}_{args.signatures}_"
+                f"{args.global_ratio}_{args.non_alert_ratio}_{args.seed}.json"
+            )
+            if not corpus_path.exists():
+                print(f"[*] Генерация корпуса: {events} событий")
+                generate_corpus(corpus_path, events, **params)
+
+            for repeat in range(args.repeat):
+                print(f"[*] Прогон: {events} событий, повтор {repeat + 1}/{args.repeat}")
+                stages = bench_pipeline(corpus_path, args.top_ip_count)
+                runs.append(
+                    {
+                        "events": events,
+                        "repeat": repeat,
+                        "corpus_bytes": corpus_path.stat().st_size,
+                        "params": params,
+                        "stages": stages,
+                    }
+                )
+                for item in stages:
+                    print(
+                        f"    {item['stage']:<24}{item['wall_seconds']:>10.3f} s"
+                        f"{item['rows_out'] or 0:>12} rows"
+                    )
+
+            if data_dir is None:
+                corpus_path.unlink()
+
+    return {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "benchmark": "pipeline",
+        "environment": environment_info(),
+        "runs": runs,
+    }
+
+
+def best_stage_times(payload: Dict[str, Any]) -> Dict[tuple, float]:
+    """Минимальное время по (размер, стадия) среди повторов."""
+    best: Dict[tuple, float] = {}
+    for run in payload.get("runs", []):
+        for item in run["stages"]:
+            key = (run["events"], item["stage"])
+            best[key] = min(best.get(key, float("inf")), item["wall_seconds"])
+    return best
+
+
+def run_compare(args: argparse.Namespace) -> Dict[str, Any]:
+    payloads = [json.loads(Path(path).read_text(encoding="utf-8")) for path in (args.baseline, args.candidate)]
+    for path, payload in zip((args.baseline, args.candidate), payloads):
+        if payload.get("schema_version") != RESULTS_SCHEMA_VERSION or payload.get("benchmark") != "pipeline":
+            raise SystemExit(f"{path}: ожидались результаты pipeline версии {RESULTS_SCHEMA_VERSION}")
+
+    baseline, candidate = (best_stage_times(payload) for payload in payloads)
+    rows: List[Dict[str, Any]] = []
+    print(f"{'events':>10}  {'stage':<24}{'baseline':>10}{'candidate':>11}{'speedup':>9}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        speedup = baseline[key] / max(candidate[key], 1e-9)
+        rows.append(
+            {
+                "events": key[0],
+                "stage": key[1],
+                "baseline_seconds": baseline[key],
+                "candidate_seconds": candidate[key],
+                "speedup": round(speedup, 3),
+            }
+        )
+        print(f"{key[0]:>10}  {key[1]:<24}{baseline[key]:>10.3f}{candidate[key]:>11.3f}{speedup:>8.2f}x")
+
+    return {
+        "schema_version": RESULTS_SCHEMA_VERSION,
+        "benchmark": "compare",
+        "baseline": args.baseline,
+        "candidate": args.candidate,
+        "results": rows,
+    }
+
+
+def add_corpus_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--distinct-ips", type=int, default=DEFAULT_DISTINCT_IPS, help="Число разных внешних IP")
+    parser.add_argument("--signatures", type=int, default=DEFAULT_SIGNATURES, help="Число разных сигнатур")
+    parser.add_argument(
+        "--global-ratio",
+        type=float,
+        default=DEFAULT_GLOBAL_RATIO,
+        help="Доля внешних адресов среди src/dest",
+    )
+    parser.add_argument(
+        "--non-alert-ratio",
+        type=float,
+        default=DEFAULT_NON_ALERT_RATIO,
+        help="Доля событий других типов (flow) в корпусе",
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed генератора")
+
+
+def parse_args() -> argparse.Namespace:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--output", default=None, help="Сохранить результаты в JSON-файл")
+
+    parser = argparse.ArgumentParser(description="Бенчмарки пайплайна Suricata + VirusTotal")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reports = subparsers.add_parser(
+        "reports",
+        parents=[common],
+        help="Сравнить форматы отчёта: время записи и размер",
+    )
+    reports.add_argument("--rows", type=int, default=DEFAULT_REPORT_ROWS, help="Строк в синтетическом отчёте")
+    reports.add_argument("--seed", type=int, default=DEFAULT_SEED, help="Seed генератора")
+    reports.add_argument(
+        "--formats",
+        nargs="+",
+        choices=list(pipeline.REPORT_WRITERS),
+        default=list(pipeline.REPORT_WRITERS),
+        help="Какие форматы сравнивать",
+    )
+    reports.add_argument("--partition-by-date", action="store_true", help="Писать отчёт по датам")
+    reports.set_defaults(handler=run_reports)
+
+    generate = subparsers.add_parser(
+        "generate",
+        parents=[common],
+        help="Сгенерировать синтетический eve.json",
+    )
+    generate.add_argument("path", help="Куда записать корпус")
+    generate.add_argument("--events", type=parse_size, default=parse_size("10k"), help="Число событий (10k, 1m, ...)")
+    add_corpus_arguments(generate)
+    generate.set_defaults(handler=run_generate)
+
+    pipeline_parser = subparsers.add_parser(
+        "pipeline",
+        parents=[common],
+        help="Замерить функции пайплайна на синтетических корпусах",
+    )
+    pipeline_parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=[parse_size(size) for size in DEFAULT_PIPELINE_SIZES],
+        help="Размеры корпусов в событиях (по умолчанию 10k 1m 10m)",
+    )
+    pipeline_parser.add_argument("--repeat", type=int, default=1, help="Повторов на каждый размер")
+    pipeline_parser.add_argument(
+        "--top-ip-count",
+        type=int,
+        default=pipeline.DEFAULT_VT_MAX_IPS,
+        help="Сколько IP обогащать через mock VT",
+    )
+    pipeline_parser.add_argument(
+        "--data-dir",
+        default=None,
+        help="Каталог для корпусов; если задан, корпуса сохраняются и переиспользуются",
+    )
+    add_corpus_arguments(pipeline_parser)
+    pipeline_parser.set_defaults(handler=run_pipeline)
+
+    compare = subparsers.add_parser(
+        "compare",
+        parents=[common],
+        help="Сравнить два JSON-файла с результатами pipeline",
+    )
+    compare.add_argument("baseline", help="Результаты до изменений")
+    compare.add_argument("candidate", help="Результаты после изменений")
+    compare.set_defaults(handler=run_compare)
+
+    return parser.parse_args()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    args = parse_args()
+    payload = args.handler(args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"\nРезультаты сохранены: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,25 +1,75 @@
 from __future__ import annotations
 
 import argparse
+import bisect
+import email.utils
+import functools
+import glob
+import hashlib
 import ipaddress
 import json
 import logging
 import os
 import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, TextIO, Tuple, Union
 
 import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
 import requests
 
+from stage_metrics import PipelineProfiler, StageMetrics, accumulate_stage
+
+try:
+    import vt_cache as shared_vt_cache
+except ImportError:  # общий модуль из ../shared не установлен — работаем без кэша VT
+    shared_vt_cache = None
+
+if TYPE_CHECKING:
+    from vt_cache import VTCache
+
 VT_BASE_URL = "https://www.virustotal.com/api/v3/ip_addresses"
+DEFAULT_VT_CACHE_FILE = "vt_cache.sqlite3"
+DEFAULT_VT_CACHE_MAX_ENTRIES = 50_000
 DEFAULT_LOG_FILE = "alerts-only.json"
 DEFAULT_REPORT_FILE = "threat_report.csv"
 DEFAULT_CHART_FILE = "threat_chart.png"
 
+# Размер порции строк при потоковом чтении логов и размер буфера чтения.
+# eve.json бывает многогигабайтным, поэтому файл целиком в память не грузим.
+DEFAULT_READ_CHUNK_ROWS = 50_000
+READ_BUFFER_SIZE = 1 << 20
+# Сквозной номер кандидата при многофайловой обработке: номер файла << 40 плюс
+# позиция внутри файла. Так порядок первого появления совпадает с чтением
+# файлов по очереди в одном процессе.
+FILE_ORDER_SHIFT = 40
+DEFAULT_INGEST_WORKERS = 1
+# Стадии, которые при потоковом чтении идут порциями вперемешку: время
+# каждой набирается по всем порциям (и воркерам) отдельно.
+INGEST_STAGES = ("read", "extract", "summarize")
+# Сколько частичных агрегаций сливается за раз. Слияние с каждой новой
+# порцией перегруппировывало бы всё накопленное состояние (O(порций × IP)),
+# а дерево слияний по PARTIAL_MERGE_FAN_IN частей — почти линейно.
+PARTIAL_MERGE_FAN_IN = 16
+
+# Режим --follow: окна (длительность, число корзин кольцевого буфера),
+# окно, по которому считается risk_score, и ограничения памяти.
+FOLLOW_WINDOWS = {"5m": (300, 60), "1h": (3600, 60), "24h": (86_400, 96)}
+FOLLOW_SCORE_WINDOW = "24h"
+FOLLOW_MAX_SIGNATURES_PER_IP = 64
+DEFAULT_FOLLOW_POLL_INTERVAL = 0.2
+DEFAULT_FOLLOW_MAX_IPS = 100_000
+
+# По скольким первым байтам файла логов узнаём, что его подменили при ротации.
+CHECKPOINT_FINGERPRINT_BYTES = 4096
+
 # Пороговые значения и веса вынесены в константы,
 # чтобы их было проще менять и объяснять.
 RISK_HIGH_THRESHOLD = 55
@@ -31,12 +81,20 @@ RISK_SIGNATURE_WEIGHT = 2
 RISK_VT_MALICIOUS_WEIGHT = 6
 RISK_VT_SUSPICIOUS_WEIGHT = 3
 RISK_NEGATIVE_REPUTATION_WEIGHT = 0.5
+RISK_LEVEL_ORDER = {"low": 0, "medium": 1, "high": 2}
 
 DEFAULT_VT_MAX_IPS = 8
 DEFAULT_VT_TIMEOUT = 20
 DEFAULT_VT_SLEEP_SECONDS = 0.0
 DEFAULT_VT_RETRIES = 2
 DEFAULT_VT_RETRY_DELAY = 1.5
+DEFAULT_VT_CONCURRENCY = 1
+# Квоты VirusTotal: 0 — без ограничения (для публичного ключа это 4 и 500).
+DEFAULT_VT_REQUESTS_PER_MINUTE = 0
+DEFAULT_VT_REQUESTS_PER_DAY = 0
+
+# Сколько разных IP помнит классификатор внешних адресов.
+DEFAULT_IP_CACHE_SIZE = 65_536
 
 
 @dataclass
@@ -55,6 +113,23 @@ class VTResult:
     vt_error: str = ""
 
 
+@dataclass(frozen=True)
+class RiskWeights:
+    """Профиль весов и порогов risk_score; по умолчанию — константы RISK_*."""
+
+    alert: float = RISK_ALERT_WEIGHT
+    severity: float = RISK_SEVERITY_WEIGHT
+    signature: float = RISK_SIGNATURE_WEIGHT
+    vt_malicious: float = RISK_VT_MALICIOUS_WEIGHT
+    vt_suspicious: float = RISK_VT_SUSPICIOUS_WEIGHT
+    negative_reputation: float = RISK_NEGATIVE_REPUTATION_WEIGHT
+    high_threshold: float = RISK_HIGH_THRESHOLD
+    medium_threshold: float = RISK_MEDIUM_THRESHOLD
+
+
+DEFAULT_RISK_WEIGHTS = RiskWeights()
+
+
 def setup_logging() -> None:
     """Настройка простого логирования в консоль."""
     logging.basicConfig(
@@ -156,13 +231,67 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--log-file",
         default=get_env_str("SURICATA_LOG_PATH", DEFAULT_LOG_FILE),
-        help="Путь к JSON-файлу с alert-логами Suricata",
+        help="Путь к логам Suricata: JSON-массив или NDJSON (eve.json). "
+        "Можно указать каталог (берутся все *.json) или glob-шаблон",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=get_env_int("INGEST_WORKERS", DEFAULT_INGEST_WORKERS),
+        help="Сколько процессов разбирают файлы логов параллельно (0 — по числу ядер)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=get_env_int("READ_CHUNK_ROWS", DEFAULT_READ_CHUNK_ROWS),
+        help="Сколько alert-событий разбирать за одну порцию при чтении логов",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Следить за дописыванием eve.json и принимать решения BLOCK/NOTIFY "
+        "по скользящим окнам 5 мин / 1 ч / 24 ч",
+    )
+    parser.add_argument(
+        "--follow-from-start",
+        action="store_true",
+        help="В режиме --follow сначала прочитать уже записанную часть файла",
+    )
+    parser.add_argument(
+        "--follow-poll-interval",
+        type=float,
+        default=get_env_float("FOLLOW_POLL_INTERVAL", DEFAULT_FOLLOW_POLL_INTERVAL),
+        help="Пауза между проверками файла в режиме --follow, секунды",
+    )
+    parser.add_argument(
+        "--follow-max-ips",
+        type=int,
+        default=get_env_int("FOLLOW_MAX_IPS", DEFAULT_FOLLOW_MAX_IPS),
+        help="Сколько IP держать в памяти в режиме --follow (давно неактивные вытесняются)",
+    )
+    parser.add_argument(
+        "--state-file",
+        default=get_env_str("PIPELINE_STATE_FILE", ""),
+        help="Файл состояния для инкрементальной обработки растущего eve.json "
+        "(по умолчанию логи каждый раз читаются целиком)",
     )
     parser.add_argument(
         "--report-file",
         default=get_env_str("REPORT_FILE", DEFAULT_REPORT_FILE),
         help="Имя итогового CSV-отчёта",
     )
+    parser.add_argument(
+        "--report-format",
+        choices=["auto", *REPORT_WRITERS],
+        default=get_env_str("REPORT_FORMAT", "auto"),
+        help="Формат отчёта: csv, parquet, feather (auto — по расширению файла)",
+    )
+    parser.add_argument(
+        "--partition-by-date",
+        action="store_true",
+        default=get_env_bool("REPORT_PARTITION_BY_DATE", False),
+        help="Разложить отчёт по каталогам report_date=ГГГГ-ММ-ДД (по last_seen)",
+    )
     parser.add_argument(
         "--chart-file",
         default=get_env_str("CHART_FILE", DEFAULT_CHART_FILE),
@@ -198,100 +327,354 @@ def parse_args() -> argparse.Namespace:
         default=get_env_float("VT_RETRY_DELAY", DEFAULT_VT_RETRY_DELAY),
         help="Задержка между повторными попытками запроса к VirusTotal",
     )
+    parser.add_argument(
+        "--vt-concurrency",
+        type=int,
+        default=get_env_int("VT_CONCURRENCY", DEFAULT_VT_CONCURRENCY),
+        help="Сколько запросов к VirusTotal выполнять параллельно",
+    )
+    parser.add_argument(
+        "--vt-per-minute",
+        type=int,
+        default=get_env_int("VT_REQUESTS_PER_MINUTE", DEFAULT_VT_REQUESTS_PER_MINUTE),
+        help="Лимит запросов к VirusTotal в минуту (0 — без ограничения)",
+    )
+    parser.add_argument(
+        "--vt-per-day",
+        type=int,
+        default=get_env_int("VT_REQUESTS_PER_DAY", DEFAULT_VT_REQUESTS_PER_DAY),
+        help="Лимит запросов к VirusTotal в сутки (0 — без ограничения)",
+    )
+    parser.add_argument(
+        "--vt-base-url",
+        default=get_env_str("VT_BASE_URL", VT_BASE_URL),
+        help="Базовый URL ip_addresses API VirusTotal (например, локальная заглушка)",
+    )
+    parser.add_argument(
+        "--vt-cache",
+        default=get_env_str("VT_CACHE_PATH", DEFAULT_VT_CACHE_FILE),
+        help="Файл SQLite-кэша ответов VirusTotal",
+    )
+    parser.add_argument(
+        "--vt-cache-max-entries",
+        type=int,
+        default=get_env_int("VT_CACHE_MAX_ENTRIES", DEFAULT_VT_CACHE_MAX_ENTRIES),
+        help="Максимальное число записей в кэше VirusTotal",
+    )
+    parser.add_argument(
+        "--no-vt-cache",
+        action="store_true",
+        help="Не использовать кэш ответов VirusTotal",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=get_env_str("METRICS_FILE", ""),
+        help="JSON-файл с замерами по стадиям (время, CPU, память, строки)",
+    )
+    parser.add_argument(
+        "--prometheus-file",
+        default=get_env_str("PROMETHEUS_TEXTFILE", ""),
+        help="Те же замеры в формате Prometheus textfile (для node_exporter)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Считать пик памяти Python по стадиям через tracemalloc (медленнее)",
+    )
     parser.add_argument(
         "--use-mock-vt",
         action="store_true",
         help="Не ходить в реальный VirusTotal, а использовать демонстрационные данные",
     )
+    parser.add_argument(
+        "--local-cidrs",
+        default=get_env_str("LOCAL_CIDRS", ""),
+        help="Сети через запятую, которые всегда считаются локальными "
+        "(например, собственные публичные диапазоны)",
+    )
+    parser.add_argument(
+        "--external-cidrs",
+        default=get_env_str("EXTERNAL_CIDRS", ""),
+        help="Сети через запятую, которые всегда считаются внешними",
+    )
+    parser.add_argument(
+        "--risk-weights",
+        default=get_env_str("RISK_WEIGHTS_FILE", ""),
+        help="JSON-файл с весами и порогами risk_score (ключи как у RiskWeights)",
+    )
     return parser.parse_args()
 
 
-def is_global_ip(ip: str) -> bool:
-    try:
-        return ipaddress.ip_address(ip).is_global
-    except ValueError:
-        return False
+IPNetwork = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
 
 
-def read_suricata_alerts(log_file: str) -> pd.DataFrame:
-    path = Path(log_file)
-    if not path.exists():
-        raise FileNotFoundError(f"Файл логов не найден: {path}")
+class CidrIndex:
+    """Отсортированные непересекающиеся интервалы адресов для поиска через bisect."""
+
+    def __init__(self, networks: Iterable[IPNetwork]) -> None:
+        intervals: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        for network in networks:
+            intervals[network.version].append(
+                (int(network.network_address), int(network.broadcast_address))
+            )
+
+        self._starts: Dict[int, List[int]] = {}
+        self._ends: Dict[int, List[int]] = {}
+        for version, items in intervals.items():
+            merged: List[List[int]] = []
+            for start, end in sorted(items):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], end)
+                else:
+                    merged.append([start, end])
+            self._starts[version] = [start for start, _ in merged]
+            self._ends[version] = [end for _, end in merged]
+
+    def __len__(self) -> int:
+        return sum(len(starts) for starts in self._starts.values())
+
+    def contains(self, address: ipaddress.IPv4Address | ipaddress.IPv6Address) -> bool:
+        starts = self._starts[address.version]
+        value = int(address)
+        position = bisect.bisect_right(starts, value) - 1
+        return position >= 0 and value <= self._ends[address.version][position]
+
+
+def parse_cidr_list(raw: str) -> List[IPNetwork]:
+    networks: List[IPNetwork] = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError as exc:
+            raise ValueError(f"Некорректная сеть в списке CIDR: {item!r}") from exc
+    return networks
+
+
+class IPClassifier:
+    """Решает, считать ли IP внешним, с LRU-кэшем по строке адреса.
+
+    Сети из local_networks всегда локальные (имеют приоритет),
+    сети из external_networks всегда внешние, остальное — по is_global.
+    """
+
+    def __init__(
+        self,
+        local_networks: Iterable[IPNetwork] = (),
+        external_networks: Iterable[IPNetwork] = (),
+        cache_size: int = DEFAULT_IP_CACHE_SIZE,
+    ) -> None:
+        self._local_index = CidrIndex(local_networks)
+        self._external_index = CidrIndex(external_networks)
+        self.is_global = functools.lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+
+        if self._local_index.contains(address):
+            return False
+        if self._external_index.contains(address):
+            return True
+        return address.is_global
+
+    def cache_info(self) -> Dict[str, Any]:
+        return self.is_global.cache_info()._asdict()
+
+
+DEFAULT_IP_CLASSIFIER = IPClassifier()
 
-    with path.open("r", encoding="utf-8") as handle:
-        data = json.load(handle)
 
-    if not isinstance(data, list):
+def is_global_ip(ip: str) -> bool:
+    return DEFAULT_IP_CLASSIFIER.is_global(ip)
+
+
+def _iter_json_array(handle: TextIO) -> Iterator[Any]:
+    """Поэлементно разбирает JSON-массив, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = handle.read(READ_BUFFER_SIZE).lstrip()
+    if not buffer.startswith("["):
         raise ValueError("Ожидался JSON-массив с alert-событиями Suricata")
+    pos = 1
+    eof = False
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+
+        if pos >= len(buffer):
+            if eof:
+                raise ValueError("JSON-массив оборван: нет закрывающей скобки")
+            buffer = handle.read(READ_BUFFER_SIZE)
+            pos = 0
+            eof = not buffer
+            continue
 
-    rows: List[Dict[str, Any]] = []
-    for event in data:
-        alert = event.get("alert", {})
-        rows.append(
-            {
-                "timestamp": event.get("timestamp"),
-                "src_ip": event.get("src_ip", ""),
-                "src_port": event.get("src_port"),
-                "dest_ip": event.get("dest_ip", ""),
-                "dest_port": event.get("dest_port"),
-                "proto": event.get("proto", ""),
-                "signature": alert.get("signature", "Unknown"),
-                "category": alert.get("category", "Unknown"),
-                "severity": alert.get("severity", 3),
-                "action": alert.get("action", "unknown"),
-            }
-        )
+        if buffer[pos] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as exc:
+            if eof:
+                raise ValueError(f"Некорректный JSON в логах: {exc}") from exc
+            chunk = handle.read(READ_BUFFER_SIZE)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+
+        yield item
+        pos = end
+
+
+def _iter_ndjson(handle: TextIO) -> Iterator[Any]:
+    for line_number, raw_line in enumerate(handle, start=1):
+        line = raw_line.strip()
+        if not line:
+            continue
+        # В eve.json большая часть строк — flow/dns/http и т.п. Строку без
+        # подстроки "alert" можно отбросить, не тратя время на json.loads.
+        if '"alert"' not in line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(
+                f"Некорректный JSON в строке {line_number}: {exc}"
+            ) from exc
+
+
+def iter_suricata_events(handle: TextIO) -> Iterator[Dict[str, Any]]:
+    """Возвращает alert-события из JSON-массива или NDJSON (eve.json)."""
+    first_char = ""
+    while not first_char:
+        char = handle.read(1)
+        if not char:
+            return
+        if not char.isspace():
+            first_char = char
+    handle.seek(0)
+
+    if first_char == "[":
+        events = _iter_json_array(handle)
+    elif first_char == "{":
+        events = _iter_ndjson(handle)
+    else:
+        raise ValueError("Ожидался JSON-массив или NDJSON с событиями Suricata")
 
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        if event.get("event_type", "alert") != "alert":
+            continue
+        yield event
+
+
+def alert_event_to_row(event: Dict[str, Any]) -> Dict[str, Any]:
+    alert = event.get("alert", {})
+    return {
+        "timestamp": event.get("timestamp"),
+        "src_ip": event.get("src_ip", ""),
+        "src_port": event.get("src_port"),
+        "dest_ip": event.get("dest_ip", ""),
+        "dest_port": event.get("dest_port"),
+        "proto": event.get("proto", ""),
+        "signature": alert.get("signature", "Unknown"),
+        "category": alert.get("category", "Unknown"),
+        "severity": alert.get("severity", 3),
+        "action": alert.get("action", "unknown"),
+    }
+
+
+def alert_rows_to_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
     df = pd.DataFrame(rows)
     if df.empty:
-        raise ValueError("Логи загружены, но alert-события отсутствуют")
-
+        return df
     df["timestamp"] = pd.to_datetime(df["timestamp"], errors="coerce")
     df["severity"] = pd.to_numeric(df["severity"], errors="coerce").fillna(3).astype(int)
     return df
 
 
-def extract_candidate_ips(df: pd.DataFrame) -> pd.DataFrame:
-    records: List[Dict[str, Any]] = []
-
-    for row in df.to_dict(orient="records"):
-        src_ip = row["src_ip"]
-        dest_ip = row["dest_ip"]
-
-        base_record = {
-            "timestamp": row["timestamp"],
-            "signature": row["signature"],
-            "category": row["category"],
-            "severity": row["severity"],
-            "proto": row["proto"],
-            "src_ip": src_ip,
-            "dest_ip": dest_ip,
-            "src_port": row["src_port"],
-            "dest_port": row["dest_port"],
-            "action": row["action"],
-        }
+def iter_alert_chunks(
+    log_file: str,
+    chunk_size: int = DEFAULT_READ_CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Потоково читает логи Suricata и отдаёт alert-события порциями."""
+    path = Path(log_file)
+    if not path.exists():
+        raise FileNotFoundError(f"Файл логов не найден: {path}")
 
-        if is_global_ip(src_ip):
-            records.append(
-                {
-                    "candidate_ip": src_ip,
-                    "direction": "inbound",
-                    "local_peer": dest_ip,
-                    **base_record,
-                }
-            )
+    chunk_size = max(1, chunk_size)
+    rows: List[Dict[str, Any]] = []
+    with path.open("r", encoding="utf-8-sig") as handle:
+        for event in iter_suricata_events(handle):
+            rows.append(alert_event_to_row(event))
+            if len(rows) >= chunk_size:
+                yield alert_rows_to_frame(rows)
+                rows = []
 
-        if is_global_ip(dest_ip):
-            records.append(
-                {
-                    "candidate_ip": dest_ip,
-                    "direction": "outbound",
-                    "local_peer": src_ip,
-                    **base_record,
-                }
-            )
+    if rows:
+        yield alert_rows_to_frame(rows)
+
+
+def read_suricata_alerts(
+    log_file: str,
+    chunk_size: int = DEFAULT_READ_CHUNK_ROWS,
+) -> pd.DataFrame:
+    """Все alert-события файла одним DataFrame.
+
+    Собирает порции iter_alert_chunks и держит в памяти весь файл, поэтому
+    main() им не пользуется — он агрегирует порции по мере чтения
+    (summarize_log_files). Нужна для бенчмарка отдельных стадий.
+    """
+    chunks = list(iter_alert_chunks(log_file, chunk_size=chunk_size))
+    if not chunks:
+        raise ValueError("Логи загружены, но alert-события отсутствуют")
+    return chunks[0] if len(chunks) == 1 else pd.concat(chunks, ignore_index=True)
+
+
+CANDIDATE_BASE_COLUMNS = [
+    "timestamp",
+    "signature",
+    "category",
+    "severity",
+    "proto",
+    "src_ip",
+    "dest_ip",
+    "src_port",
+    "dest_port",
+    "action",
+]
+
+
+def classify_global_ips(
+    src: pd.Series,
+    dest: pd.Series,
+    classifier: IPClassifier | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Классифицирует src/dest как внешние, разбирая каждый уникальный адрес один раз."""
+    is_global = (classifier or DEFAULT_IP_CLASSIFIER).is_global
+    codes, uniques = pd.factorize(pd.concat([src, dest], ignore_index=True))
+    unique_flags = np.fromiter(
+        (is_global(ip) for ip in uniques),
+        dtype=bool,
+        count=len(uniques),
+    )
+    # Код -1 у factorize означает пропуск: такие адреса внешними не считаем.
+    flags = np.append(unique_flags, False)[codes]
+    return flags[: len(src)], flags[len(src):]
 
-    candidate_df = pd.DataFrame(records)
+
+def extract_candidate_ips(
+    df: pd.DataFrame,
+    classifier: IPClassifier | None = None,
+) -> pd.DataFrame:
+    candidate_df = build_candidate_frame(df, classifier=classifier)
     if candidate_df.empty:
         raise ValueError(
             "В логах не найдено ни одного внешнего IP-адреса для анализа."
@@ -299,45 +682,230 @@ def extract_candidate_ips(df: pd.DataFrame) -> pd.DataFrame:
     return candidate_df
 
 
-def most_common_string(values: Iterable[str]) -> str:
-    series = pd.Series(list(values), dtype="object")
-    if series.empty:
-        return ""
-    mode = series.mode()
-    return str(mode.iloc[0]) if not mode.empty else str(series.iloc[0])
-
-
-def summarize_candidates(candidate_df: pd.DataFrame) -> pd.DataFrame:
-    grouped_rows: List[Dict[str, Any]] = []
-
-    for ip, group in candidate_df.groupby("candidate_ip", sort=False):
-        directions = ", ".join(
-            sorted(group["direction"].dropna().astype(str).unique().tolist())
+def build_candidate_frame(
+    df: pd.DataFrame,
+    classifier: IPClassifier | None = None,
+) -> pd.DataFrame:
+    src_global, dest_global = classify_global_ips(
+        df["src_ip"], df["dest_ip"], classifier=classifier
+    )
+    base_df = df[CANDIDATE_BASE_COLUMNS].reset_index(drop=True)
+
+    inbound_df = base_df[src_global]
+    inbound_df.insert(0, "candidate_ip", inbound_df["src_ip"])
+    inbound_df.insert(1, "direction", "inbound")
+    inbound_df.insert(2, "local_peer", inbound_df["dest_ip"])
+
+    outbound_df = base_df[dest_global]
+    outbound_df.insert(0, "candidate_ip", outbound_df["dest_ip"])
+    outbound_df.insert(1, "direction", "outbound")
+    outbound_df.insert(2, "local_peer", outbound_df["src_ip"])
+
+    candidate_df = pd.concat([inbound_df, outbound_df])
+
+    # Сохраняем порядок построчного обхода: для каждого события сначала
+    # inbound-запись, затем outbound.
+    order_key = np.concatenate(
+        [
+            inbound_df.index.to_numpy() * 2,
+            outbound_df.index.to_numpy() * 2 + 1,
+        ]
+    )
+    candidate_df = candidate_df.iloc[np.argsort(order_key, kind="stable")]
+    return candidate_df.reset_index(drop=True)
+
+
+def join_ranked_values(ranked: pd.DataFrame, group_count: int, top_n: int) -> pd.Series:
+    """Склеивает значения с rank < top_n через ", " без Python-цикла по группам."""
+    joined = np.full(group_count, "", dtype=object)
+    for rank in range(top_n):
+        part = ranked[ranked["rank"] == rank]
+        if part.empty:
+            break
+        positions = part["code"].to_numpy()
+        prefix = "" if rank == 0 else ", "
+        joined[positions] = joined[positions] + (prefix + part["value"].astype(str)).to_numpy(dtype=object)
+    return pd.Series(joined, dtype="object")
+
+
+PARTIAL_VALUE_FIELDS = ("direction", "signature", "category", "local_peer")
+
+
+def build_partial_summary(
+    candidate_df: pd.DataFrame,
+    order_offset: int = 0,
+) -> Dict[str, pd.DataFrame]:
+    """Частичная агрегация кандидатов по IP, которую можно сливать с другими.
+
+    ips — счётчики по IP, values — частоты значений полей по IP. order —
+    сквозной номер строки-кандидата: по минимальному order восстанавливается
+    порядок первого появления IP и значений при любом порядке слияния.
+    """
+    codes, ips = pd.factorize(candidate_df["candidate_ip"], sort=False)
+    valid = codes >= 0
+    work = candidate_df[valid]
+    codes = codes[valid]
+    order = np.flatnonzero(valid).astype("int64") + order_offset
+
+    ip_df = (
+        pd.DataFrame(
+            {
+                "code": codes,
+                "order": order,
+                "severity": work["severity"].to_numpy(),
+                "timestamp": work["timestamp"].array,
+            }
         )
-        top_local_peers = (
-            group["local_peer"].astype(str).value_counts().head(3).index.tolist()
+        .groupby("code", sort=True)
+        .agg(
+            alert_count=("order", "size"),
+            critical_severity=("severity", "min"),
+            first_seen=("timestamp", "min"),
+            last_seen=("timestamp", "max"),
+            first_order=("order", "min"),
         )
-
-        grouped_rows.append(
+    )
+    ip_df.index = pd.Index(ips[ip_df.index.to_numpy()], name="ip")
+
+    value_parts: List[pd.DataFrame] = []
+    for field in PARTIAL_VALUE_FIELDS:
+        column = work[field]
+        if field == "direction":
+            column = column.where(column.isna(), column.astype(str))
+        elif field == "local_peer":
+            column = column.astype(str)
+        part = (
+            pd.DataFrame({"code": codes, "value": column.to_numpy(), "order": order})
+            .groupby(["code", "value"], sort=False)
+            .agg(count=("order", "size"), first_order=("order", "min"))
+            .reset_index()
+        )
+        part.insert(0, "ip", ips[part["code"].to_numpy()])
+        part.insert(1, "field", field)
+        value_parts.append(part.drop(columns="code"))
+
+    return {"ips": ip_df, "values": pd.concat(value_parts, ignore_index=True)}
+
+
+def merge_partial_summaries(
+    parts: Iterable[Dict[str, pd.DataFrame] | None],
+) -> Dict[str, pd.DataFrame] | None:
+    """Сливает частичные агрегации. Операция ассоциативна и коммутативна."""
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+
+    ip_df = (
+        pd.concat([part["ips"] for part in parts])
+        .groupby(level="ip", sort=False)
+        .agg(
             {
-                "ip": ip,
-                "alert_count": int(len(group)),
-                "directions": directions,
-                "unique_signatures": int(group["signature"].nunique()),
-                "unique_categories": int(group["category"].nunique()),
-                "critical_severity": int(group["severity"].min()),
-                "top_signature": most_common_string(group["signature"].tolist()),
-                "top_category": most_common_string(group["category"].tolist()),
-                "top_local_peers": ", ".join(top_local_peers),
-                "first_seen": group["timestamp"].min(),
-                "last_seen": group["timestamp"].max(),
+                "alert_count": "sum",
+                "critical_severity": "min",
+                "first_seen": "min",
+                "last_seen": "max",
+                "first_order": "min",
             }
         )
+    )
+    values_df = (
+        pd.concat([part["values"] for part in parts], ignore_index=True)
+        .groupby(["ip", "field", "value"], sort=False)
+        .agg(count=("count", "sum"), first_order=("first_order", "min"))
+        .reset_index()
+    )
+    return {"ips": ip_df, "values": values_df}
+
+
+class PartialSummaryMerger:
+    """Копит частичные агрегации и сливает их деревом по fan_in штук на уровень."""
+
+    def __init__(self, fan_in: int = PARTIAL_MERGE_FAN_IN) -> None:
+        self.fan_in = max(2, fan_in)
+        self.levels: List[List[Dict[str, pd.DataFrame]]] = []
+
+    def add(self, part: Dict[str, pd.DataFrame] | None) -> None:
+        level = 0
+        while part is not None:
+            if level == len(self.levels):
+                self.levels.append([])
+            self.levels[level].append(part)
+            if len(self.levels[level]) < self.fan_in:
+                return
+            part = merge_partial_summaries(self.levels[level])
+            self.levels[level] = []
+            level += 1
+
+    def result(self) -> Dict[str, pd.DataFrame] | None:
+        return merge_partial_summaries(part for level in self.levels for part in level)
+
+
+def rank_field_values(values_df: pd.DataFrame, field: str, tie_break: str) -> pd.DataFrame:
+    """Ранжирует значения поля внутри каждого IP.
+
+    tie_break="smallest" — по убыванию частоты, при равенстве по возрастанию
+    значения (как mode); "first" — при равенстве по первому появлению (как
+    value_counts); "alphabetical" — просто по возрастанию значения.
+    """
+    part = values_df[values_df["field"] == field]
+    value_rank = pd.factorize(part["value"], sort=True)[0]
+    codes = part["code"].to_numpy()
+    if tie_break == "alphabetical":
+        order = np.lexsort((value_rank, codes))
+    elif tie_break == "smallest":
+        order = np.lexsort((value_rank, -part["count"].to_numpy(), codes))
+    else:
+        order = np.lexsort(
+            (part["first_order"].to_numpy(), -part["count"].to_numpy(), codes)
+        )
+    ranked = part.iloc[order].reset_index(drop=True)
+    ranked["rank"] = ranked.groupby("code", sort=False).cumcount()
+    return ranked
+
 
-    summary_df = pd.DataFrame(grouped_rows)
-    if summary_df.empty:
+def finalize_partial_summary(partial: Dict[str, pd.DataFrame] | None) -> pd.DataFrame:
+    if partial is None or partial["ips"].empty:
         raise ValueError("Не удалось агрегировать подозрительные IP-адреса.")
 
+    ip_df = partial["ips"].sort_values("first_order", kind="stable")
+    group_count = len(ip_df)
+    values_df = partial["values"]
+    values_df = values_df.assign(code=ip_df.index.get_indexer(values_df["ip"]))
+
+    def unique_count(field: str) -> np.ndarray:
+        counts = values_df.loc[values_df["field"] == field, "code"].value_counts()
+        return counts.reindex(range(group_count), fill_value=0).to_numpy().astype(int)
+
+    directions = rank_field_values(values_df, "direction", "alphabetical")
+
+    summary_df = pd.DataFrame(
+        {
+            "ip": ip_df.index.to_numpy(),
+            "alert_count": ip_df["alert_count"].astype(int).to_numpy(),
+            "directions": join_ranked_values(
+                directions,
+                group_count,
+                top_n=int(directions["rank"].max()) + 1 if not directions.empty else 0,
+            ).to_numpy(),
+            "unique_signatures": unique_count("signature"),
+            "unique_categories": unique_count("category"),
+            "critical_severity": ip_df["critical_severity"].astype(int).to_numpy(),
+            "top_signature": join_ranked_values(
+                rank_field_values(values_df, "signature", "smallest"), group_count, 1
+            ).to_numpy(),
+            "top_category": join_ranked_values(
+                rank_field_values(values_df, "category", "smallest"), group_count, 1
+            ).to_numpy(),
+            "top_local_peers": join_ranked_values(
+                rank_field_values(values_df, "local_peer", "first"), group_count, 3
+            ).to_numpy(),
+            "first_seen": ip_df["first_seen"].array,
+            "last_seen": ip_df["last_seen"].array,
+        }
+    )
+
     summary_df = summary_df.sort_values(
         by=["alert_count", "critical_severity", "unique_signatures"],
         ascending=[False, True, False],
@@ -346,6 +914,376 @@ def summarize_candidates(candidate_df: pd.DataFrame) -> pd.DataFrame:
     return summary_df
 
 
+def summarize_candidates(candidate_df: pd.DataFrame) -> pd.DataFrame:
+    return finalize_partial_summary(build_partial_summary(candidate_df))
+
+
+def resolve_log_files(log_spec: str) -> List[Path]:
+    path = Path(log_spec)
+    if path.is_dir():
+        files = sorted(item for item in path.glob("*.json") if item.is_file())
+    elif glob.has_magic(log_spec):
+        files = sorted(Path(item) for item in glob.glob(log_spec) if Path(item).is_file())
+    else:
+        files = [path]
+
+    if not files:
+        raise FileNotFoundError(f"Не найдено ни одного файла логов: {log_spec}")
+    return files
+
+
+def new_ingest_stages() -> Dict[str, StageMetrics]:
+    stages = {name: StageMetrics(stage=name, rows_in=0, rows_out=0) for name in INGEST_STAGES}
+    stages["read"].rows_in = None
+    return stages
+
+
+def aggregate_alert_chunks(
+    chunks: Iterator[pd.DataFrame],
+    merger: PartialSummaryMerger,
+    classifier: IPClassifier | None,
+    order_offset: int,
+    stages: Dict[str, StageMetrics],
+) -> int:
+    """Прогоняет порции через extract и summarize. Возвращает число кандидатов."""
+    read, extract, summarize = (stages[name] for name in INGEST_STAGES)
+    candidates = 0
+    while True:
+        with accumulate_stage(read):
+            chunk_df = next(chunks, None)
+        if chunk_df is None:
+            return candidates
+        if chunk_df.empty:
+            continue
+        read.rows_out += len(chunk_df)
+
+        with accumulate_stage(extract):
+            candidate_df = build_candidate_frame(chunk_df, classifier=classifier)
+        extract.rows_in += len(chunk_df)
+        extract.rows_out += len(candidate_df)
+        if candidate_df.empty:
+            continue
+
+        with accumulate_stage(summarize):
+            merger.add(build_partial_summary(candidate_df, order_offset + candidates))
+        summarize.rows_in += len(candidate_df)
+        candidates += len(candidate_df)
+
+
+def summarize_log_file(
+    log_file: str,
+    file_index: int,
+    local_cidrs: str,
+    external_cidrs: str,
+    chunk_size: int,
+) -> Tuple[Dict[str, pd.DataFrame] | None, Dict[str, StageMetrics]]:
+    """Разбирает один файл и агрегирует его по IP. Выполняется в процессе-воркере."""
+    classifier = IPClassifier(
+        local_networks=parse_cidr_list(local_cidrs),
+        external_networks=parse_cidr_list(external_cidrs),
+    )
+    stages = new_ingest_stages()
+    merger = PartialSummaryMerger()
+    aggregate_alert_chunks(
+        iter_alert_chunks(log_file, chunk_size=chunk_size),
+        merger,
+        classifier,
+        file_index << FILE_ORDER_SHIFT,
+        stages,
+    )
+    with accumulate_stage(stages["summarize"]):
+        partial = merger.result()
+    return partial, stages
+
+
+def summarize_log_files(
+    log_files: List[Path],
+    local_cidrs: str = "",
+    external_cidrs: str = "",
+    chunk_size: int = DEFAULT_READ_CHUNK_ROWS,
+    workers: int = DEFAULT_INGEST_WORKERS,
+    stages: Dict[str, StageMetrics] | None = None,
+) -> pd.DataFrame:
+    """Агрегирует несколько файлов (например, от разных сенсоров) в одну сводку по IP.
+
+    Результат совпадает с последовательной обработкой файлов в одном процессе,
+    потому что слияние частичных агрегаций ассоциативно и коммутативно.
+    В stages (см. new_ingest_stages) набираются время и строки read/extract/
+    summarize; при нескольких воркерах время суммируется по процессам.
+    """
+    if stages is None:
+        stages = new_ingest_stages()
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(log_files))
+    jobs = [
+        (str(log_file), index, local_cidrs, external_cidrs, chunk_size)
+        for index, log_file in enumerate(log_files)
+    ]
+
+    merger = PartialSummaryMerger()
+
+    def add_file_result(result: Tuple[Dict[str, pd.DataFrame] | None, Dict[str, StageMetrics]]) -> None:
+        partial, file_stages = result
+        for name, metrics in file_stages.items():
+            stages[name].absorb(metrics)
+        with accumulate_stage(stages["summarize"]):
+            merger.add(partial)
+
+    if workers <= 1:
+        for job in jobs:
+            add_file_result(summarize_log_file(*job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(summarize_log_file, *job) for job in jobs]
+            # Сливаем по мере готовности, чтобы не держать все части в памяти.
+            for future in as_completed(futures):
+                add_file_result(future.result())
+
+    with accumulate_stage(stages["summarize"]):
+        partial = merger.result()
+        if partial is None:
+            raise ValueError(
+                "В логах не найдено ни одного внешнего IP-адреса для анализа."
+            )
+        summary_df = finalize_partial_summary(partial)
+    stages["summarize"].rows_out = len(summary_df)
+    return summary_df
+
+
+@dataclass
+class PipelineCheckpoint:
+    """Позиция в растущем eve.json и накопленная агрегация по IP."""
+
+    offset: int = 0
+    inode: int = 0
+    device: int = 0
+    fingerprint: str = ""
+    fingerprint_size: int = 0
+    candidates_seen: int = 0
+    partial: Dict[str, pd.DataFrame] | None = None
+
+
+CHECKPOINT_FORMAT_VERSION = 1
+CHECKPOINT_POSITION_FIELDS = (
+    "offset",
+    "inode",
+    "device",
+    "fingerprint",
+    "fingerprint_size",
+    "candidates_seen",
+)
+
+
+def checkpoint_partial_paths(path: Path, generation: int) -> Dict[str, Path]:
+    return {
+        name: path.with_name(f"{path.name}.{generation}.{name}.csv")
+        for name in ("ips", "values")
+    }
+
+
+def load_checkpoint(state_file: str) -> PipelineCheckpoint:
+    """Читает состояние: позиция в JSON, частичная агрегация — в CSV рядом с ним."""
+    path = Path(state_file)
+    if not path.exists():
+        return PipelineCheckpoint()
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+        if state.get("version") != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError(f"неизвестная версия {state.get('version')!r}")
+        checkpoint = PipelineCheckpoint(
+            **{name: state[name] for name in CHECKPOINT_POSITION_FIELDS}
+        )
+    except (UnicodeDecodeError, ValueError, KeyError, TypeError, AttributeError) as exc:
+        raise ValueError(
+            f"Файл состояния повреждён или имеет другой формат: {path} ({exc})"
+        ) from exc
+
+    generation = state.get("generation")
+    if generation is not None:
+        paths = checkpoint_partial_paths(path, generation)
+        ip_df = pd.read_csv(paths["ips"], index_col="ip", dtype={"ip": str})
+        for column in ("first_seen", "last_seen"):
+            try:
+                ip_df[column] = pd.to_datetime(ip_df[column], format="ISO8601")
+            except ValueError:
+                # Разные смещения зон в одном логе: приводим к UTC.
+                ip_df[column] = pd.to_datetime(ip_df[column], format="ISO8601", utc=True)
+        # keep_default_na=False: пустая строка и "NA" — обычные значения полей.
+        values_df = pd.read_csv(
+            paths["values"],
+            dtype={"ip": str, "field": str, "value": str},
+            keep_default_na=False,
+        )
+        checkpoint.partial = {"ips": ip_df, "values": values_df}
+    return checkpoint
+
+
+def save_checkpoint(checkpoint: PipelineCheckpoint, state_file: str) -> None:
+    """Сохраняет состояние без pickle: JSON с позицией и CSV с агрегацией.
+
+    CSV пишутся под новым номером поколения, и только потом атомарно
+    подменяется JSON, который на них ссылается. Прерванная запись оставляет
+    прежнее согласованное состояние.
+    """
+    path = Path(state_file)
+    previous_generation = None
+    if path.exists():
+        try:
+            previous_generation = json.loads(path.read_text(encoding="utf-8")).get("generation")
+        except (UnicodeDecodeError, ValueError, AttributeError):
+            previous_generation = None
+
+    state: Dict[str, Any] = {"version": CHECKPOINT_FORMAT_VERSION}
+    state.update({name: getattr(checkpoint, name) for name in CHECKPOINT_POSITION_FIELDS})
+    state["generation"] = None
+    if checkpoint.partial is not None:
+        generation = (previous_generation or 0) + 1
+        paths = checkpoint_partial_paths(path, generation)
+        checkpoint.partial["ips"].to_csv(paths["ips"], date_format="%Y-%m-%dT%H:%M:%S.%f%z")
+        checkpoint.partial["values"].to_csv(paths["values"], index=False)
+        state["generation"] = generation
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+    if previous_generation is not None and previous_generation != state["generation"]:
+        for old_path in checkpoint_partial_paths(path, previous_generation).values():
+            old_path.unlink(missing_ok=True)
+
+
+def file_fingerprint(path: Path, size: int) -> str:
+    with path.open("rb") as handle:
+        return hashlib.sha1(handle.read(size)).hexdigest()
+
+
+def iter_ndjson_alert_chunks_from(
+    path: Path,
+    offset: int,
+    chunk_size: int = DEFAULT_READ_CHUNK_ROWS,
+) -> Iterator[Tuple[pd.DataFrame, int]]:
+    """Читает NDJSON с байтового смещения и отдаёт (порция alert-событий, смещение).
+
+    Смещение всегда указывает на конец последней полной строки: строку,
+    которую Suricata ещё дописывает, дочитаем при следующем запуске.
+    """
+    rows: List[Dict[str, Any]] = []
+    position = offset
+    with path.open("rb") as handle:
+        handle.seek(offset)
+        for raw_line in handle:
+            if not raw_line.endswith(b"\n"):
+                break
+            position += len(raw_line)
+            if b'"alert"' not in raw_line:
+                continue
+            try:
+                event = json.loads(raw_line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(
+                    f"Некорректный JSON в {path} на смещении {position - len(raw_line)}: {exc}"
+                ) from exc
+            if not isinstance(event, dict) or event.get("event_type", "alert") != "alert":
+                continue
+            rows.append(alert_event_to_row(event))
+            if len(rows) >= chunk_size:
+                yield alert_rows_to_frame(rows), position
+                rows = []
+
+    yield alert_rows_to_frame(rows), position
+
+
+def consume_log_increment(
+    checkpoint: PipelineCheckpoint,
+    path: Path,
+    classifier: IPClassifier | None,
+    chunk_size: int,
+    stages: Dict[str, StageMetrics],
+) -> int:
+    """Добавляет к состоянию события после checkpoint.offset. Возвращает число alert-событий."""
+
+    def chunks() -> Iterator[pd.DataFrame]:
+        for chunk_df, position in iter_ndjson_alert_chunks_from(path, checkpoint.offset, chunk_size):
+            yield chunk_df
+            # Сюда возвращаемся, когда порция уже учтена в агрегации.
+            checkpoint.offset = position
+
+    alerts_before = stages["read"].rows_out
+    merger = PartialSummaryMerger()
+    merger.add(checkpoint.partial)
+    checkpoint.candidates_seen += aggregate_alert_chunks(
+        chunks(), merger, classifier, checkpoint.candidates_seen, stages
+    )
+    with accumulate_stage(stages["summarize"]):
+        checkpoint.partial = merger.result()
+    return stages["read"].rows_out - alerts_before
+
+
+def find_rotated_log(path: Path, checkpoint: PipelineCheckpoint) -> Path | None:
+    """Ищет переименованный при ротации файл (eve.json.1), который читали в прошлый раз."""
+    for candidate in (path.with_name(path.name + ".1"), path.with_name(path.stem + ".1" + path.suffix)):
+        try:
+            stat = candidate.stat()
+        except OSError:
+            continue
+        if (stat.st_ino, stat.st_dev) == (checkpoint.inode, checkpoint.device):
+            return candidate
+    return None
+
+
+def update_checkpoint(
+    checkpoint: PipelineCheckpoint,
+    log_file: str,
+    classifier: IPClassifier | None = None,
+    chunk_size: int = DEFAULT_READ_CHUNK_ROWS,
+    stages: Dict[str, StageMetrics] | None = None,
+) -> int:
+    """Дочитывает новые байты eve.json в состояние с учётом ротации логов."""
+    if stages is None:
+        stages = new_ingest_stages()
+    path = Path(log_file)
+    if not path.exists():
+        raise FileNotFoundError(f"Файл логов не найден: {path}")
+
+    with path.open("rb") as handle:
+        if handle.read(CHECKPOINT_FINGERPRINT_BYTES).lstrip().startswith(b"["):
+            raise ValueError(
+                "Инкрементальный режим поддерживает только NDJSON (eve.json), "
+                "а не JSON-массив"
+            )
+
+    stat = path.stat()
+    same_file = (stat.st_ino, stat.st_dev) == (checkpoint.inode, checkpoint.device)
+    rotated = checkpoint.inode != 0 and (
+        not same_file
+        or stat.st_size < checkpoint.offset
+        or file_fingerprint(path, checkpoint.fingerprint_size) != checkpoint.fingerprint
+    )
+
+    alert_count = 0
+    if rotated:
+        rotated_path = None if same_file else find_rotated_log(path, checkpoint)
+        if rotated_path is not None:
+            logging.info("Дочитываем хвост ротированного файла: %s", rotated_path)
+            alert_count += consume_log_increment(
+                checkpoint, rotated_path, classifier, chunk_size, stages
+            )
+        else:
+            logging.warning(
+                "Файл логов %s был ротирован или усечён, читаем его с начала.", path
+            )
+        checkpoint.offset = 0
+
+    alert_count += consume_log_increment(checkpoint, path, classifier, chunk_size, stages)
+
+    checkpoint.inode = stat.st_ino
+    checkpoint.device = stat.st_dev
+    checkpoint.fingerprint_size = min(checkpoint.offset, CHECKPOINT_FINGERPRINT_BYTES)
+    checkpoint.fingerprint = file_fingerprint(path, checkpoint.fingerprint_size)
+    return alert_count
+
+
 MOCK_VT_DATA: Dict[str, VTResult] = {
     "64.135.77.30": VTResult("64.135.77.30", "mock", 7, 2, 9, 60, -18, "US", "Example ISP", "64.135.77.0/24", "scan,ssh"),
     "217.182.164.10": VTResult("217.182.164.10", "mock", 5, 1, 12, 58, -10, "FR", "OVH SAS", "217.182.160.0/19", "scanner"),
@@ -360,24 +1298,148 @@ def get_mock_vt_result(ip: str) -> VTResult:
     return MOCK_VT_DATA.get(ip, VTResult(ip=ip, vt_lookup_status="mock"))
 
 
+def get_mock_vt_lookup(ip: str) -> Tuple[VTResult, Dict[str, Any] | None]:
+    return get_mock_vt_result(ip), None
+
+
+class VTRateLimiter:
+    """Token bucket на запросы в минуту плюс суточная квота.
+
+    Один экземпляр разделяется всеми потоками; пауза из Retry-After
+    применяется сразу ко всем запросам.
+    """
+
+    def __init__(self, per_minute: int = 0, per_day: int = 0) -> None:
+        self.per_minute = max(0, per_minute)
+        self.per_day = max(0, per_day)
+        self._lock = threading.Lock()
+        self._tokens = float(self.per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._day_started = self._updated
+        self._day_count = 0
+
+    def acquire(self) -> bool:
+        """Ждёт свободный токен. Возвращает False, если суточная квота исчерпана."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._day_started >= 86_400:
+                self._day_started = now
+                self._day_count = 0
+            if self.per_day and self._day_count >= self.per_day:
+                return False
+            self._day_count += 1
+
+            wait = max(0.0, self._paused_until - now)
+            if self.per_minute:
+                rate = self.per_minute / 60.0
+                self._tokens = min(
+                    float(self.per_minute),
+                    self._tokens + (now - self._updated) * rate,
+                )
+                self._updated = now
+                # Токен резервируется сразу, поэтому при нехватке баланс уходит
+                # в минус, а ожидание считается от величины долга.
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / rate)
+
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def defer(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def make_vt_session(pool_size: int = DEFAULT_VT_CONCURRENCY) -> requests.Session:
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=max(1, pool_size),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def vt_result_from_payload(ip: str, payload: Dict[str, Any]) -> VTResult:
+    """VTResult из тела ответа VT — свежего или взятого из общего кэша."""
+    # Ошибки VT отдаёт объектом {"error": {...}}; в кэше так хранится not_found.
+    if "error" in payload:
+        return VTResult(
+            ip=ip,
+            vt_lookup_status="not_found",
+            vt_error="IP отсутствует в VirusTotal",
+        )
+
+    attributes = payload.get("data", {}).get("attributes", {})
+    stats = attributes.get("last_analysis_stats", {})
+    tags = attributes.get("tags", []) or []
+
+    return VTResult(
+        ip=ip,
+        vt_lookup_status="ok",
+        vt_malicious=int(stats.get("malicious", 0) or 0),
+        vt_suspicious=int(stats.get("suspicious", 0) or 0),
+        vt_harmless=int(stats.get("harmless", 0) or 0),
+        vt_undetected=int(stats.get("undetected", 0) or 0),
+        vt_reputation=int(attributes.get("reputation", 0) or 0),
+        vt_country=str(attributes.get("country", "") or ""),
+        vt_as_owner=str(attributes.get("as_owner", "") or ""),
+        vt_network=str(attributes.get("network", "") or ""),
+        vt_tags=", ".join(map(str, tags[:5])),
+    )
+
+
 def query_virustotal_ip(
     ip: str,
     api_key: str,
     timeout: int = DEFAULT_VT_TIMEOUT,
     retries: int = DEFAULT_VT_RETRIES,
     retry_delay: float = DEFAULT_VT_RETRY_DELAY,
-) -> VTResult:
+    session: requests.Session | None = None,
+    limiter: VTRateLimiter | None = None,
+    base_url: str = VT_BASE_URL,
+) -> Tuple[VTResult, Dict[str, Any] | None]:
+    """Результат проверки IP и тело ответа VT для кэша (None — не кэшируется)."""
     headers = {"x-apikey": api_key}
-    url = f"{VT_BASE_URL}/{ip}"
+    url = f"{base_url.rstrip('/')}/{ip}"
+    http = session or requests
 
     for attempt in range(retries + 1):
+        if limiter is not None and not limiter.acquire():
+            return VTResult(
+                ip=ip,
+                vt_lookup_status="rate_limited",
+                vt_error="Исчерпана суточная квота запросов VirusTotal",
+            ), None
+
         try:
-            response = requests.get(url, headers=headers, timeout=timeout)
+            response = http.get(url, headers=headers, timeout=timeout)
         except requests.RequestException as exc:
             if attempt < retries:
                 time.sleep(retry_delay)
                 continue
-            return VTResult(ip=ip, vt_lookup_status="request_error", vt_error=str(exc))
+            return VTResult(ip=ip, vt_lookup_status="request_error", vt_error=str(exc)), None
 
         if response.status_code == 200:
             try:
@@ -387,49 +1449,39 @@ def query_virustotal_ip(
                     ip=ip,
                     vt_lookup_status="invalid_json",
                     vt_error="Response is not valid JSON",
-                )
-
-            attributes = payload.get("data", {}).get("attributes", {})
-            stats = attributes.get("last_analysis_stats", {})
-            tags = attributes.get("tags", []) or []
-
-            return VTResult(
-                ip=ip,
-                vt_lookup_status="ok",
-                vt_malicious=int(stats.get("malicious", 0) or 0),
-                vt_suspicious=int(stats.get("suspicious", 0) or 0),
-                vt_harmless=int(stats.get("harmless", 0) or 0),
-                vt_undetected=int(stats.get("undetected", 0) or 0),
-                vt_reputation=int(attributes.get("reputation", 0) or 0),
-                vt_country=str(attributes.get("country", "") or ""),
-                vt_as_owner=str(attributes.get("as_owner", "") or ""),
-                vt_network=str(attributes.get("network", "") or ""),
-                vt_tags=", ".join(map(str, tags[:5])),
-            )
+                ), None
+            return vt_result_from_payload(ip, payload), payload
 
         if response.status_code == 404:
-            return VTResult(
-                ip=ip,
-                vt_lookup_status="not_found",
-                vt_error="IP отсутствует в VirusTotal",
-            )
+            try:
+                payload = response.json()
+            except json.JSONDecodeError:
+                payload = None
+            if not isinstance(payload, dict) or "error" not in payload:
+                payload = {"error": {"code": "NotFoundError", "message": response.text[:200]}}
+            return vt_result_from_payload(ip, payload), payload
 
         if response.status_code == 401:
             return VTResult(
                 ip=ip,
                 vt_lookup_status="unauthorized",
                 vt_error="Неверный API-ключ VirusTotal",
-            )
+            ), None
 
         if response.status_code == 429:
             if attempt < retries:
-                time.sleep(retry_delay)
+                delay = parse_retry_after(response.headers.get("Retry-After"))
+                delay = retry_delay if delay is None else delay
+                if limiter is not None:
+                    limiter.defer(delay)
+                else:
+                    time.sleep(delay)
                 continue
             return VTResult(
                 ip=ip,
                 vt_lookup_status="rate_limited",
                 vt_error="Превышен лимит запросов VirusTotal",
-            )
+            ), None
 
         if 500 <= response.status_code < 600 and attempt < retries:
             time.sleep(retry_delay)
@@ -440,13 +1492,29 @@ def query_virustotal_ip(
             ip=ip,
             vt_lookup_status=f"http_{response.status_code}",
             vt_error=error_text,
-        )
+        ), None
 
     return VTResult(
         ip=ip,
         vt_lookup_status="unknown_error",
         vt_error="Неизвестная ошибка при запросе к VirusTotal",
-    )
+    ), None
+
+
+def load_cached_vt_rows(
+    cache: VTCache | None,
+    ips: Iterable[str],
+) -> Dict[str, Dict[str, Any]]:
+    rows: Dict[str, Dict[str, Any]] = {}
+    if cache is None:
+        return rows
+
+    # Кэш общий с клиентом из ДЗ №13: там лежат сырые ответы VT по IP.
+    for ip in ips:
+        payload = cache.get(shared_vt_cache.IP_NAMESPACE, ip)
+        if payload is not None:
+            rows[ip] = vt_result_from_payload(ip, payload).__dict__
+    return rows
 
 
 def enrich_with_virustotal(
@@ -458,26 +1526,51 @@ def enrich_with_virustotal(
     use_mock_vt: bool,
     retries: int,
     retry_delay: float,
+    concurrency: int = DEFAULT_VT_CONCURRENCY,
+    limiter: VTRateLimiter | None = None,
+    base_url: str = VT_BASE_URL,
+    cache: VTCache | None = None,
 ) -> pd.DataFrame:
-    vt_rows: List[Dict[str, Any]] = []
-
     lookup_targets = summary_df.head(top_ip_count)["ip"].tolist()
-    for ip in lookup_targets:
-        if use_mock_vt:
-            result = get_mock_vt_result(ip)
-        else:
-            result = query_virustotal_ip(
-                ip=ip,
-                api_key=api_key,
-                timeout=timeout,
-                retries=retries,
-                retry_delay=retry_delay,
-            )
 
-        vt_rows.append(result.__dict__)
+    if use_mock_vt:
+        vt_rows = [get_mock_vt_result(ip).__dict__ for ip in lookup_targets]
+    else:
+        cached_rows = load_cached_vt_rows(cache, lookup_targets)
+        pending = [ip for ip in lookup_targets if ip not in cached_rows]
+        fetched: List[Tuple[VTResult, Dict[str, Any] | None]] = []
+        concurrency = max(1, min(concurrency, len(pending) or 1))
+        with make_vt_session(concurrency) as session:
+
+            def lookup(ip: str) -> Tuple[VTResult, Dict[str, Any] | None]:
+                result = query_virustotal_ip(
+                    ip=ip,
+                    api_key=api_key,
+                    timeout=timeout,
+                    retries=retries,
+                    retry_delay=retry_delay,
+                    session=session,
+                    limiter=limiter,
+                    base_url=base_url,
+                )
+                if sleep_seconds > 0:
+                    time.sleep(sleep_seconds)
+                return result
+
+            if concurrency == 1:
+                fetched = [lookup(ip) for ip in pending]
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    fetched = list(executor.map(lookup, pending))
+
+        # SQLite-соединение не делится между потоками, поэтому пишем отсюда.
+        if cache is not None:
+            for result, payload in fetched:
+                if payload is not None:
+                    cache.put(shared_vt_cache.IP_NAMESPACE, result.ip, result.vt_lookup_status, payload)
 
-        if sleep_seconds > 0:
-            time.sleep(sleep_seconds)
+        fetched_by_ip = {result.ip: result.__dict__ for result, _ in fetched}
+        vt_rows = [cached_rows.get(ip) or fetched_by_ip[ip] for ip in lookup_targets]
 
     if vt_rows:
         vt_df = pd.DataFrame(vt_rows)
@@ -516,32 +1609,122 @@ def enrich_with_virustotal(
     return merged_df
 
 
-def classify_risk(score: float) -> str:
-    if score >= RISK_HIGH_THRESHOLD:
+def load_risk_weights(path: str) -> RiskWeights:
+    """Читает профиль весов; не указанные в файле поля берутся по умолчанию."""
+    if not path:
+        return DEFAULT_RISK_WEIGHTS
+
+    config_path = Path(path)
+    if not config_path.exists():
+        raise FileNotFoundError(f"Файл весов не найден: {config_path}")
+
+    with config_path.open("r", encoding="utf-8") as file:
+        config = json.load(file)
+    if not isinstance(config, dict):
+        raise ValueError(f"Файл весов {config_path} должен содержать JSON-объект")
+
+    unknown = sorted(set(config) - set(RiskWeights.__dataclass_fields__))
+    if unknown:
+        raise ValueError(f"Неизвестные параметры в {config_path}: {', '.join(unknown)}")
+    try:
+        return RiskWeights(**{key: float(value) for key, value in config.items()})
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Некорректное значение в {config_path}: {exc}") from exc
+
+
+def build_risk_features(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Признаки для risk_score; не зависят от весов, поэтому считаются один раз."""
+
+    def column(name: str) -> np.ndarray:
+        return df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    reputation = column("vt_reputation")
+    return {
+        "alert": column("alert_count"),
+        "severity": 4 - np.clip(column("critical_severity"), 1, 3),
+        "signature": column("unique_signatures"),
+        "vt_malicious": column("vt_malicious"),
+        "vt_suspicious": column("vt_suspicious"),
+        "negative_reputation": np.where(reputation < 0, -reputation, 0.0),
+    }
+
+
+def score_risk(
+    features: Dict[str, np.ndarray],
+    weights: RiskWeights = DEFAULT_RISK_WEIGHTS,
+) -> np.ndarray:
+    # Слагаемые идут в том же порядке, что и раньше: результат round()
+    # не должен зависеть от порядка сложения float.
+    score = features["alert"] * weights.alert
+    score = score + features["severity"] * weights.severity
+    score = score + features["signature"] * weights.signature
+    score = score + features["vt_malicious"] * weights.vt_malicious
+    score = score + features["vt_suspicious"] * weights.vt_suspicious
+    score = score + features["negative_reputation"] * weights.negative_reputation
+    return np.round(score, 2)
+
+
+def classify_risk_levels(
+    scores: np.ndarray,
+    weights: RiskWeights = DEFAULT_RISK_WEIGHTS,
+) -> np.ndarray:
+    return np.select(
+        [scores >= weights.high_threshold, scores >= weights.medium_threshold],
+        ["high", "medium"],
+        default="low",
+    ).astype(object)
+
+
+def compute_risk_score(
+    alert_count: int,
+    critical_severity: int,
+    unique_signatures: int,
+    vt_malicious: float = 0,
+    vt_suspicious: float = 0,
+    vt_reputation: float = 0,
+    weights: RiskWeights = DEFAULT_RISK_WEIGHTS,
+) -> float:
+    """Та же формула, что в score_risk, для одного IP."""
+    severity_weight = 4 - min(max(int(critical_severity), 1), 3)
+    negative_reputation = abs(vt_reputation) if vt_reputation < 0 else 0
+    return round(
+        alert_count * weights.alert
+        + severity_weight * weights.severity
+        + unique_signatures * weights.signature
+        + vt_malicious * weights.vt_malicious
+        + vt_suspicious * weights.vt_suspicious
+        + negative_reputation * weights.negative_reputation,
+        2,
+    )
+
+
+def classify_risk(score: float, weights: RiskWeights = DEFAULT_RISK_WEIGHTS) -> str:
+    if score >= weights.high_threshold:
         return "high"
-    if score >= RISK_MEDIUM_THRESHOLD:
+    if score >= weights.medium_threshold:
         return "medium"
     return "low"
 
 
-def add_risk_metrics(df: pd.DataFrame) -> pd.DataFrame:
-
-    severity_weight = (4 - df["critical_severity"].clip(lower=1, upper=3)).astype(int)
-    negative_reputation = df["vt_reputation"].apply(
-        lambda value: abs(value) if value < 0 else 0
-    )
+def add_risk_metrics(
+    df: pd.DataFrame,
+    weights: RiskWeights = DEFAULT_RISK_WEIGHTS,
+    features: Dict[str, np.ndarray] | None = None,
+) -> pd.DataFrame:
+    """Добавляет risk_score и risk_level и сортирует IP по убыванию риска.
 
-    df = df.copy()
-    df["risk_score"] = (
-        df["alert_count"] * RISK_ALERT_WEIGHT
-        + severity_weight * RISK_SEVERITY_WEIGHT
-        + df["unique_signatures"] * RISK_SIGNATURE_WEIGHT
-        + df["vt_malicious"] * RISK_VT_MALICIOUS_WEIGHT
-        + df["vt_suspicious"] * RISK_VT_SUSPICIOUS_WEIGHT
-        + negative_reputation * RISK_NEGATIVE_REPUTATION_WEIGHT
-    ).round(2)
+    features можно передать из build_risk_features, чтобы пересчитать
+    тот же набор IP с другим профилем весов без повторной подготовки.
+    """
+    if features is None:
+        features = build_risk_features(df)
+    scores = score_risk(features, weights)
 
-    df["risk_level"] = df["risk_score"].apply(classify_risk)
+    # Исходный df не меняем, но и данные не копируем: новые колонки
+    # добавляются к поверхностной копии, копирует только сортировка.
+    df = df.copy(deep=False)
+    df["risk_score"] = scores
+    df["risk_level"] = classify_risk_levels(scores, weights)
 
     return df.sort_values(
         by=["risk_score", "alert_count"],
@@ -585,13 +1768,114 @@ def simulate_response(df: pd.DataFrame) -> None:
         )
 
 
-def save_report(df: pd.DataFrame, report_file: str) -> None:
+REPORT_INT_COLUMNS = [
+    "alert_count",
+    "unique_signatures",
+    "unique_categories",
+    "critical_severity",
+    "vt_malicious",
+    "vt_suspicious",
+    "vt_harmless",
+    "vt_undetected",
+    "vt_reputation",
+]
+REPORT_RISK_LEVELS = ["low", "medium", "high"]
+
+
+def prepare_typed_report(df: pd.DataFrame) -> pd.DataFrame:
+    """Типы для колоночных форматов: счётчики int64, время в UTC, уровни риска — категория."""
+    export_df = df.copy(deep=False)
+    for column in REPORT_INT_COLUMNS:
+        if column in export_df:
+            export_df[column] = (
+                pd.to_numeric(export_df[column], errors="coerce").fillna(0).astype("int64")
+            )
+    for column in ["first_seen", "last_seen"]:
+        if column in export_df:
+            export_df[column] = pd.to_datetime(export_df[column], utc=True, errors="coerce")
+    if "risk_level" in export_df:
+        export_df["risk_level"] = pd.Categorical(
+            export_df["risk_level"], categories=REPORT_RISK_LEVELS, ordered=True
+        )
+    return export_df
+
+
+def write_csv_report(df: pd.DataFrame, path: Path) -> None:
     export_df = df.copy()
     for column in ["first_seen", "last_seen"]:
         export_df[column] = export_df[column].astype(str)
 
-    export_df.to_csv(report_file, index=False, encoding="utf-8-sig")
-    logging.info("\n[OK] CSV-отчёт сохранён: %s", report_file)
+    export_df.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def require_pyarrow(report_format: str) -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as exc:
+        raise RuntimeError(
+            f"Для отчёта в формате {report_format} нужен пакет pyarrow: pip install pyarrow"
+        ) from exc
+
+
+def write_parquet_report(df: pd.DataFrame, path: Path) -> None:
+    require_pyarrow("parquet")
+    prepare_typed_report(df).to_parquet(path, index=False, engine="pyarrow")
+
+
+def write_feather_report(df: pd.DataFrame, path: Path) -> None:
+    require_pyarrow("feather")
+    prepare_typed_report(df).reset_index(drop=True).to_feather(path)
+
+
+ReportWriter = Callable[[pd.DataFrame, Path], None]
+
+REPORT_WRITERS: Dict[str, ReportWriter] = {
+    "csv": write_csv_report,
+    "parquet": write_parquet_report,
+    "feather": write_feather_report,
+}
+REPORT_EXTENSIONS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+}
+
+
+def detect_report_format(report_file: str) -> str:
+    return REPORT_EXTENSIONS.get(Path(report_file).suffix.lower(), "csv")
+
+
+def save_report(
+    df: pd.DataFrame,
+    report_file: str,
+    report_format: str = "auto",
+    partition_by_date: bool = False,
+) -> None:
+    if report_format == "auto":
+        report_format = detect_report_format(report_file)
+    writer = REPORT_WRITERS.get(report_format)
+    if writer is None:
+        raise ValueError(f"Неизвестный формат отчёта: {report_format}")
+
+    path = Path(report_file)
+    if not partition_by_date:
+        writer(df, path)
+        logging.info("\n[OK] Отчёт (%s) сохранён: %s", report_format, path)
+        return
+
+    # Каталоги в стиле Hive (report_date=...), их понимают pyarrow и Spark.
+    report_dates = pd.to_datetime(df["last_seen"], utc=True, errors="coerce").dt.strftime("%Y-%m-%d")
+    for report_date, part_df in df.groupby(report_dates.fillna("unknown"), sort=True):
+        part_dir = path.parent / path.stem / f"report_date={report_date}"
+        part_dir.mkdir(parents=True, exist_ok=True)
+        writer(part_df, part_dir / f"part-0{path.suffix}")
+    logging.info(
+        "\n[OK] Отчёт (%s) сохранён по датам в каталог: %s",
+        report_format,
+        path.parent / path.stem,
+    )
 
 
 def build_chart(df: pd.DataFrame, chart_file: str) -> None:
@@ -615,12 +1899,20 @@ def build_chart(df: pd.DataFrame, chart_file: str) -> None:
     logging.info("[OK] PNG-график сохранён: %s", chart_file)
 
 
-def print_summary(df: pd.DataFrame) -> None:
+def print_summary(df: pd.DataFrame, cache_stats: Dict[str, int] | None = None) -> None:
     logging.info("=== Краткая сводка ===")
     logging.info("Всего внешних IP в отчёте: %s", len(df))
     logging.info("High risk: %s", int((df["risk_level"] == "high").sum()))
     logging.info("Medium risk: %s", int((df["risk_level"] == "medium").sum()))
     logging.info("Low risk: %s", int((df["risk_level"] == "low").sum()))
+    if cache_stats is not None:
+        logging.info(
+            "Кэш VirusTotal: попаданий %s, промахов %s, вытеснено %s, записей %s",
+            cache_stats["hits"],
+            cache_stats["misses"],
+            cache_stats["evictions"],
+            cache_stats["entries"],
+        )
 
     logging.info("\nТоп-5 IP:")
     preview_columns = [
@@ -634,6 +1926,314 @@ def print_summary(df: pd.DataFrame) -> None:
     logging.info("\n%s", df[preview_columns].head(5).to_string(index=False))
 
 
+class WindowedCounter:
+    """Скользящее окно из корзин фиксированной ширины в кольцевом буфере.
+
+    Память не зависит от числа событий: корзина, вышедшая из окна,
+    переиспользуется следующей.
+    """
+
+    __slots__ = ("bucket_seconds", "bucket_ids", "counts", "min_severity")
+
+    def __init__(self, window_seconds: float, bucket_count: int) -> None:
+        self.bucket_seconds = window_seconds / bucket_count
+        self.bucket_ids = [-1] * bucket_count
+        self.counts = [0] * bucket_count
+        self.min_severity = [3] * bucket_count
+
+    def add(self, timestamp: float, severity: int) -> None:
+        bucket_id = int(timestamp // self.bucket_seconds)
+        slot = bucket_id % len(self.counts)
+        if self.bucket_ids[slot] != bucket_id:
+            if bucket_id < self.bucket_ids[slot]:
+                return  # событие старше окна
+            self.bucket_ids[slot] = bucket_id
+            self.counts[slot] = 0
+            self.min_severity[slot] = 3
+        self.counts[slot] += 1
+        self.min_severity[slot] = min(self.min_severity[slot], severity)
+
+    def _live_slots(self, now: float) -> Iterator[int]:
+        now_bucket = int(now // self.bucket_seconds)
+        oldest = now_bucket - len(self.counts)
+        for slot, bucket_id in enumerate(self.bucket_ids):
+            if oldest < bucket_id <= now_bucket:
+                yield slot
+
+    def total(self, now: float) -> int:
+        return sum(self.counts[slot] for slot in self._live_slots(now))
+
+    def critical_severity(self, now: float) -> int:
+        return min((self.min_severity[slot] for slot in self._live_slots(now)), default=3)
+
+
+class FollowIPState:
+    __slots__ = ("windows", "signatures", "last_seen", "risk_level", "vt", "vt_pending")
+
+    def __init__(self) -> None:
+        self.windows = {
+            name: WindowedCounter(seconds, buckets)
+            for name, (seconds, buckets) in FOLLOW_WINDOWS.items()
+        }
+        # Сигнатура -> время последнего срабатывания; размер ограничен.
+        self.signatures: Dict[str, float] = {}
+        self.last_seen = 0.0
+        self.risk_level = "low"
+        self.vt: VTResult | None = None
+        self.vt_pending = False
+
+
+def event_timestamp(event: Dict[str, Any]) -> float:
+    raw = event.get("timestamp")
+    if raw:
+        try:
+            return datetime.fromisoformat(str(raw)).timestamp()
+        except ValueError:
+            parsed = pd.to_datetime(raw, errors="coerce")
+            if not pd.isna(parsed):
+                return parsed.timestamp()
+    return time.time()
+
+
+class ThreatFollower:
+    """Оконные агрегаты по IP и решения BLOCK/NOTIFY для потока alert-событий.
+
+    risk_score пересчитывается только для IP, которых коснулось событие.
+    VT запрашивается в фоне, когда IP впервые доходит до уровня medium.
+    """
+
+    def __init__(
+        self,
+        classifier: IPClassifier | None = None,
+        vt_lookup: Callable[[str], Tuple[VTResult, Dict[str, Any] | None]] | None = None,
+        vt_cache: VTCache | None = None,
+        max_ips: int = DEFAULT_FOLLOW_MAX_IPS,
+        vt_workers: int = DEFAULT_VT_CONCURRENCY,
+        risk_weights: RiskWeights = DEFAULT_RISK_WEIGHTS,
+    ) -> None:
+        self.classifier = classifier or DEFAULT_IP_CLASSIFIER
+        self.risk_weights = risk_weights
+        self.vt_lookup = vt_lookup
+        self.vt_cache = vt_cache
+        self.max_ips = max(1, max_ips)
+        self.ips: "OrderedDict[str, FollowIPState]" = OrderedDict()
+        self.clock = 0.0
+        self.decisions = 0
+        self._vt_futures: Dict[str, Future] = {}
+        self._vt_executor = (
+            ThreadPoolExecutor(max_workers=max(1, vt_workers)) if vt_lookup is not None else None
+        )
+
+    def close(self) -> None:
+        if self._vt_executor is not None:
+            self._vt_executor.shutdown(wait=False, cancel_futures=True)
+
+    def process_event(self, event: Dict[str, Any]) -> None:
+        row = alert_event_to_row(event)
+        timestamp = event_timestamp(event)
+        self.clock = max(self.clock, timestamp)
+        severity = pd.to_numeric(row["severity"], errors="coerce")
+        severity = 3 if pd.isna(severity) else int(severity)
+
+        for ip in (row["src_ip"], row["dest_ip"]):
+            if not self.classifier.is_global(ip):
+                continue
+            state = self.ips.get(ip)
+            if state is None:
+                state = self.ips[ip] = FollowIPState()
+                if len(self.ips) > self.max_ips:
+                    self.ips.popitem(last=False)
+            else:
+                self.ips.move_to_end(ip)
+
+            for window in state.windows.values():
+                window.add(timestamp, severity)
+            state.last_seen = max(state.last_seen, timestamp)
+            state.signatures[str(row["signature"])] = timestamp
+            if len(state.signatures) > FOLLOW_MAX_SIGNATURES_PER_IP:
+                oldest = min(state.signatures, key=state.signatures.__getitem__)
+                del state.signatures[oldest]
+
+            self.rescore(ip, state)
+
+    def rescore(self, ip: str, state: FollowIPState) -> None:
+        window = state.windows[FOLLOW_SCORE_WINDOW]
+        window_start = self.clock - FOLLOW_WINDOWS[FOLLOW_SCORE_WINDOW][0]
+        vt = state.vt or VTResult(ip=ip, vt_lookup_status="skipped")
+        score = compute_risk_score(
+            alert_count=window.total(self.clock),
+            critical_severity=window.critical_severity(self.clock),
+            unique_signatures=sum(1 for seen in state.signatures.values() if seen > window_start),
+            vt_malicious=vt.vt_malicious,
+            vt_suspicious=vt.vt_suspicious,
+            vt_reputation=vt.vt_reputation,
+            weights=self.risk_weights,
+        )
+        level = classify_risk(score, self.risk_weights)
+
+        if level != "low" and state.vt is None and not state.vt_pending:
+            self.request_vt(ip, state)
+
+        previous, state.risk_level = state.risk_level, level
+        if RISK_LEVEL_ORDER[level] > RISK_LEVEL_ORDER[previous]:
+            self.emit_decision(ip, state, score)
+
+    def request_vt(self, ip: str, state: FollowIPState) -> None:
+        if self.vt_cache is not None:
+            cached = load_cached_vt_rows(self.vt_cache, [ip]).get(ip)
+            if cached is not None:
+                state.vt = VTResult(**cached)
+                return
+        if self._vt_executor is None:
+            return
+        state.vt_pending = True
+        self._vt_futures[ip] = self._vt_executor.submit(self.vt_lookup, ip)
+
+    def poll_vt(self) -> None:
+        """Применяет завершившиеся запросы к VT и пересчитывает score этих IP."""
+        for ip, future in list(self._vt_futures.items()):
+            if not future.done():
+                continue
+            del self._vt_futures[ip]
+            try:
+                result, payload = future.result()
+            except Exception as exc:
+                result = VTResult(ip=ip, vt_lookup_status="request_error", vt_error=str(exc))
+                payload = None
+            if self.vt_cache is not None and payload is not None:
+                self.vt_cache.put(shared_vt_cache.IP_NAMESPACE, ip, result.vt_lookup_status, payload)
+            state = self.ips.get(ip)
+            if state is not None:
+                state.vt = result
+                state.vt_pending = False
+                self.rescore(ip, state)
+
+    def evict_idle(self) -> None:
+        idle_before = self.clock - FOLLOW_WINDOWS[FOLLOW_SCORE_WINDOW][0]
+        # OrderedDict упорядочен по последнему обращению, поэтому хватает начала.
+        while self.ips:
+            ip, state = next(iter(self.ips.items()))
+            if state.last_seen > idle_before or state.vt_pending:
+                break
+            del self.ips[ip]
+
+    def emit_decision(self, ip: str, state: FollowIPState, score: float) -> None:
+        self.decisions += 1
+        counts = " ".join(
+            f"{name}={window.total(self.clock)}" for name, window in state.windows.items()
+        )
+        vt_malicious = state.vt.vt_malicious if state.vt is not None else 0
+        if state.risk_level == "high":
+            logging.info(
+                "[BLOCK] IP %s | score=%s | %s | VT malicious=%s",
+                ip,
+                score,
+                counts,
+                vt_malicious,
+            )
+        else:
+            logging.info("[NOTIFY] IP %s | score=%s | %s", ip, score, counts)
+
+
+def tail_alert_events(
+    log_file: str,
+    from_start: bool = False,
+    poll_interval: float = DEFAULT_FOLLOW_POLL_INTERVAL,
+) -> Iterator[Dict[str, Any] | None]:
+    """Бесконечно отдаёт новые alert-события; None — когда новых строк пока нет.
+
+    Переживает ротацию: при смене inode или усечении файл открывается заново.
+    """
+    path = Path(log_file)
+    handle = None
+    inode = None
+    buffer = b""
+    try:
+        while True:
+            if handle is None:
+                if not path.exists():
+                    yield None
+                    time.sleep(poll_interval)
+                    continue
+                handle = path.open("rb")
+                inode = os.fstat(handle.fileno()).st_ino
+                if not from_start:
+                    handle.seek(0, os.SEEK_END)
+                from_start = True  # после ротации новый файл читаем с начала
+                buffer = b""
+
+            line = handle.readline()
+            if line:
+                buffer += line
+                if not buffer.endswith(b"\n"):
+                    continue
+                raw_line, buffer = buffer, b""
+                if b'"alert"' not in raw_line:
+                    continue
+                try:
+                    event = json.loads(raw_line)
+                except json.JSONDecodeError:
+                    logging.warning("Пропущена некорректная строка в %s", path)
+                    continue
+                if isinstance(event, dict) and event.get("event_type", "alert") == "alert":
+                    yield event
+                continue
+
+            yield None
+            try:
+                stat = path.stat()
+            except OSError:
+                stat = None
+            if stat is None or stat.st_ino != inode or stat.st_size < handle.tell():
+                handle.close()
+                handle = None
+                continue
+            time.sleep(poll_interval)
+    finally:
+        if handle is not None:
+            handle.close()
+
+
+def run_follow(
+    args: argparse.Namespace,
+    classifier: IPClassifier,
+    vt_lookup: Callable[[str], Tuple[VTResult, Dict[str, Any] | None]] | None,
+    vt_cache: VTCache | None,
+    risk_weights: RiskWeights = DEFAULT_RISK_WEIGHTS,
+) -> int:
+    follower = ThreatFollower(
+        classifier=classifier,
+        vt_lookup=vt_lookup,
+        vt_cache=vt_cache,
+        max_ips=args.follow_max_ips,
+        vt_workers=max(1, args.vt_concurrency),
+        risk_weights=risk_weights,
+    )
+    logging.info("Режим --follow: слежение за %s (Ctrl+C для остановки)", args.log_file)
+    last_housekeeping = time.monotonic()
+    try:
+        for event in tail_alert_events(
+            args.log_file,
+            from_start=args.follow_from_start,
+            poll_interval=max(0.01, args.follow_poll_interval),
+        ):
+            if event is not None:
+                follower.process_event(event)
+            follower.poll_vt()
+            if time.monotonic() - last_housekeeping >= 1.0:
+                follower.evict_idle()
+                last_housekeeping = time.monotonic()
+    except KeyboardInterrupt:
+        logging.info(
+            "\nОстановлено. IP в памяти: %s, решений: %s",
+            len(follower.ips),
+            follower.decisions,
+        )
+    finally:
+        follower.close()
+    return 0
+
+
 def main() -> int:
     setup_logging()
     load_env_file()
@@ -650,28 +2250,125 @@ def main() -> int:
         )
         return 1
 
+    vt_cache: VTCache | None = None
+    profiler = PipelineProfiler(trace_memory=args.trace_memory)
     try:
-        alerts_df = read_suricata_alerts(args.log_file)
-        candidate_df = extract_candidate_ips(alerts_df)
-        summary_df = summarize_candidates(candidate_df)
-
-        enriched_df = enrich_with_virustotal(
-            summary_df=summary_df,
-            api_key=api_key,
-            top_ip_count=max(1, args.top_ip_count),
-            timeout=max(1, args.request_timeout),
-            sleep_seconds=max(0.0, args.sleep_seconds),
-            use_mock_vt=use_mock_vt,
-            retries=max(0, args.vt_retries),
-            retry_delay=max(0.0, args.vt_retry_delay),
+        if not use_mock_vt and not args.no_vt_cache and args.vt_cache:
+            if shared_vt_cache is None:
+                logging.warning(
+                    "Кэш VirusTotal отключён: нет модуля vt_cache (pip install -e ../shared)"
+                )
+            else:
+                vt_cache = shared_vt_cache.VTCache(
+                    args.vt_cache, max_entries=args.vt_cache_max_entries
+                )
+
+        risk_weights = load_risk_weights(args.risk_weights)
+        ip_classifier = IPClassifier(
+            local_networks=parse_cidr_list(args.local_cidrs),
+            external_networks=parse_cidr_list(args.external_cidrs),
         )
+        if args.follow:
+            if use_mock_vt:
+                vt_lookup = get_mock_vt_lookup
+            else:
+                vt_session = make_vt_session(max(1, args.vt_concurrency))
+                vt_limiter = VTRateLimiter(per_minute=args.vt_per_minute, per_day=args.vt_per_day)
+                vt_lookup = functools.partial(
+                    query_virustotal_ip,
+                    api_key=api_key,
+                    timeout=max(1, args.request_timeout),
+                    retries=max(0, args.vt_retries),
+                    retry_delay=max(0.0, args.vt_retry_delay),
+                    session=vt_session,
+                    limiter=vt_limiter,
+                    base_url=args.vt_base_url,
+                )
+            return run_follow(args, ip_classifier, vt_lookup, vt_cache, risk_weights)
+
+        ingest_stages = new_ingest_stages()
+        if args.state_file:
+            checkpoint = load_checkpoint(args.state_file)
+            previous_offset = checkpoint.offset
+            new_alerts = update_checkpoint(
+                checkpoint,
+                args.log_file,
+                classifier=ip_classifier,
+                chunk_size=max(1, args.chunk_size),
+                stages=ingest_stages,
+            )
+            with profiler.stage("checkpoint"):
+                save_checkpoint(checkpoint, args.state_file)
+            with accumulate_stage(ingest_stages["summarize"]):
+                summary_df = finalize_partial_summary(checkpoint.partial)
+            ingest_stages["summarize"].rows_out = len(summary_df)
+            logging.info(
+                "Инкрементальный режим: новых alert-событий %s, смещение %s -> %s",
+                new_alerts,
+                previous_offset,
+                checkpoint.offset,
+            )
+        else:
+            # Даже один файл читается порциями с агрегацией по IP на лету:
+            # в памяти только текущая порция и частичная сводка.
+            log_files = resolve_log_files(args.log_file)
+            if len(log_files) > 1:
+                logging.info("Файлов логов: %s", len(log_files))
+            summary_df = summarize_log_files(
+                log_files,
+                local_cidrs=args.local_cidrs,
+                external_cidrs=args.external_cidrs,
+                chunk_size=max(1, args.chunk_size),
+                workers=args.workers,
+                stages=ingest_stages,
+            )
+        for metrics in ingest_stages.values():
+            profiler.add_stage(metrics)
 
-        result_df = add_risk_metrics(enriched_df)
+        with profiler.stage("enrich", rows_in=len(summary_df)) as stage:
+            enriched_df = enrich_with_virustotal(
+                summary_df=summary_df,
+                api_key=api_key,
+                top_ip_count=max(1, args.top_ip_count),
+                timeout=max(1, args.request_timeout),
+                sleep_seconds=max(0.0, args.sleep_seconds),
+                use_mock_vt=use_mock_vt,
+                retries=max(0, args.vt_retries),
+                retry_delay=max(0.0, args.vt_retry_delay),
+                concurrency=max(1, args.vt_concurrency),
+                limiter=VTRateLimiter(
+                    per_minute=args.vt_per_minute,
+                    per_day=args.vt_per_day,
+                ),
+                base_url=args.vt_base_url,
+                cache=vt_cache,
+            )
+            stage.rows_out = len(enriched_df)
+
+        with profiler.stage("risk", rows_in=len(enriched_df)) as stage:
+            result_df = add_risk_metrics(enriched_df, risk_weights)
+            stage.rows_out = len(result_df)
 
-        print_summary(result_df)
+        print_summary(result_df, vt_cache.stats() if vt_cache is not None else None)
         simulate_response(result_df)
-        save_report(result_df, args.report_file)
-        build_chart(result_df, args.chart_file)
+        with profiler.stage("report", rows_in=len(result_df)) as stage:
+            save_report(
+                result_df,
+                args.report_file,
+                report_format=args.report_format,
+                partition_by_date=args.partition_by_date,
+            )
+            stage.rows_out = len(result_df)
+        with profiler.stage("chart", rows_in=len(result_df)) as stage:
+            build_chart(result_df, args.chart_file)
+            stage.rows_out = min(5, len(result_df))
+
+        if args.metrics_file:
+            profiler.write_json(args.metrics_file)
+            logging.info("[OK] Метрики стадий сохранены: %s", args.metrics_file)
+        if args.prometheus_file:
+            profiler.write_prometheus(args.prometheus_file)
+            logging.info("[OK] Метрики Prometheus сохранены: %s", args.prometheus_file)
 
         logging.info("\nГотово. Скрипт завершил работу без ошибок.")
         return 0
@@ -699,6 +2396,10 @@ def main() -> int:
         )
         return 1
 
+    finally:
+        if vt_cache is not None:
+            vt_cache.close()
+
 
 if __name__ == "__main__":
     raise SystemExit(main())
\ No newline at end of file
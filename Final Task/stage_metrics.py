@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: пиковый RSS через resource недоступен
+    resource = None
+
+PROMETHEUS_PREFIX = "threat_pipeline"
+
+
+def peak_rss_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты.
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+@dataclass
+class StageMetrics:
+    stage: str
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_bytes: Optional[int] = None
+    peak_rss_delta_bytes: Optional[int] = None
+    tracemalloc_peak_bytes: Optional[int] = None
+    rows_in: Optional[int] = None
+    rows_out: Optional[int] = None
+
+    def absorb(self, other: "StageMetrics") -> None:
+        """Добавляет время и строки той же стадии, замеренной в другом месте (воркере)."""
+        self.wall_seconds += other.wall_seconds
+        self.cpu_seconds += other.cpu_seconds
+        if other.rows_in is not None:
+            self.rows_in = (self.rows_in or 0) + other.rows_in
+        if other.rows_out is not None:
+            self.rows_out = (self.rows_out or 0) + other.rows_out
+
+
+@contextmanager
+def accumulate_stage(metrics: StageMetrics) -> Iterator[StageMetrics]:
+    """Прибавляет время блока к стадии.
+
+    Для стадий, которые выполняются порциями вперемешку с другими
+    (чтение, извлечение и агрегация одного и того же файла).
+    """
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_seconds += time.perf_counter() - wall_started
+        metrics.cpu_seconds += time.process_time() - cpu_started
+
+
+class PipelineProfiler:
+    """Замеры по стадиям пайплайна: время, CPU, память и число строк на входе/выходе."""
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.started_at = datetime.now(timezone.utc)
+        self.stages: List[StageMetrics] = []
+        self._started = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None) -> Iterator[StageMetrics]:
+        metrics = StageMetrics(stage=name, rows_in=rows_in)
+        rss_before = peak_rss_bytes()
+        traced_before = 0
+        if self.trace_memory:
+            traced_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield metrics
+        finally:
+            metrics.wall_seconds = round(time.perf_counter() - wall_started, 6)
+            metrics.cpu_seconds = round(time.process_time() - cpu_started, 6)
+            metrics.peak_rss_bytes = peak_rss_bytes()
+            if rss_before is not None and metrics.peak_rss_bytes is not None:
+                metrics.peak_rss_delta_bytes = metrics.peak_rss_bytes - rss_before
+            if self.trace_memory:
+                metrics.tracemalloc_peak_bytes = tracemalloc.get_traced_memory()[1] - traced_before
+            self.stages.append(metrics)
+
+    def add_stage(self, metrics: StageMetrics) -> None:
+        """Записывает стадию, время которой набрано через accumulate_stage."""
+        metrics.wall_seconds = round(metrics.wall_seconds, 6)
+        metrics.cpu_seconds = round(metrics.cpu_seconds, 6)
+        metrics.peak_rss_bytes = peak_rss_bytes()
+        self.stages.append(metrics)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "started_at": self.started_at.isoformat(),
+            "total_wall_seconds": round(time.perf_counter() - self._started, 6),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "stages": [asdict(item) for item in self.stages],
+        }
+
+    def write_json(self, path: str) -> None:
+        Path(path).write_text(
+            json.dumps(self.to_dict(), ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+
+    def write_prometheus(self, path: str) -> None:
+        """Textfile для node_exporter; пишется через временный файл, чтобы не читался наполовину."""
+        gauges = [
+            ("stage_wall_seconds", "wall_seconds", "Wall time of a pipeline stage"),
+            ("stage_cpu_seconds", "cpu_seconds", "CPU time of a pipeline stage"),
+            ("stage_peak_rss_bytes", "peak_rss_bytes", "Process peak RSS after a pipeline stage"),
+            ("stage_tracemalloc_peak_bytes", "tracemalloc_peak_bytes", "Python heap peak during a pipeline stage"),
+            ("stage_rows_in", "rows_in", "Rows consumed by a pipeline stage"),
+            ("stage_rows_out", "rows_out", "Rows produced by a pipeline stage"),
+        ]
+        lines: List[str] = []
+        for metric, field, help_text in gauges:
+            samples = [
+                (item.stage, getattr(item, field))
+                for item in self.stages
+                if getattr(item, field) is not None
+            ]
+            if not samples:
+                continue
+            name = f"{PROMETHEUS_PREFIX}_{metric}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f'{name}{{stage="{stage}"}} {value}' for stage, value in samples)
+
+        name = f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds"
+        lines.append(f"# HELP {name} Unix time of the last pipeline run")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {self.started_at.timestamp():.0f}")
+
+        target = Path(path)
+        tmp_path = target.with_name(target.name + ".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp_path, target)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_CACHE_FILE = "vt_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 50_000
+# Через сколько записей (put и обновлений времени доступа при get) делать
+# commit и чистку просроченных/лишних строк. Чистка — полный проход по
+# таблице, а commit — fsync, поэтому на каждый запрос их не делаем;
+# max_entries может быть превышен не больше чем на это число.
+DEFAULT_FLUSH_EVERY = 256
+
+# Формат записей общий для всех клиентов VT в репозитории (итоговое задание
+# и ДЗ №13): namespace — тип индикатора в терминах API ("ip", "domain",
+# "url", "file"), key — канонический индикатор, payload — тело ответа VT
+# как есть. Со статусом "ok" это объект с "data", с "not_found" — с "error".
+IP_NAMESPACE = "ip"
+
+# Сколько секунд хранить ответ в зависимости от статуса запроса.
+# Статусы, которых нет в словаре (rate_limited, ошибки сети и т.п.),
+# не кэшируются вовсе, чтобы следующий запуск повторил запрос.
+DEFAULT_TTL_BY_STATUS: Dict[str, float] = {
+    "ok": 3 * 24 * 3600,
+    "not_found": 6 * 3600,
+}
+
+
+class VTCache:
+    """Постоянный кэш ответов VirusTotal в SQLite с TTL и LRU-вытеснением."""
+
+    def __init__(
+        self,
+        path: str | Path = DEFAULT_CACHE_FILE,
+        ttl_by_status: Optional[Dict[str, float]] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        flush_every: int = DEFAULT_FLUSH_EVERY,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl_by_status = dict(DEFAULT_TTL_BY_STATUS if ttl_by_status is None else ttl_by_status)
+        self.max_entries = max(1, max_entries)
+        self.flush_every = max(1, flush_every)
+        self._pending_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vt_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS vt_cache_accessed ON vt_cache (accessed_at)"
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "VTCache":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def flush(self) -> None:
+        """Чистит просроченные и лишние записи и фиксирует накопленные изменения."""
+        self._evict(time.time())
+        self._conn.commit()
+        self._pending_writes = 0
+
+    def _written(self) -> None:
+        self._pending_writes += 1
+        if self._pending_writes >= self.flush_every:
+            self.flush()
+
+    def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT payload, expires_at FROM vt_cache WHERE namespace = ? AND key = ?",
+            (namespace, key),
+        ).fetchone()
+
+        if row is None or row[1] <= now:
+            self.misses += 1
+            return None
+
+        self._conn.execute(
+            "UPDATE vt_cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+            (now, namespace, key),
+        )
+        self._written()
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, namespace: str, key: str, status: str, payload: Dict[str, Any]) -> bool:
+        """Сохраняет ответ. Возвращает False, если статус не подлежит кэшированию."""
+        ttl = self.ttl_by_status.get(status, 0)
+        if ttl <= 0:
+            return False
+
+        now = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO vt_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, status, json.dumps(payload, ensure_ascii=False), now + ttl, now),
+        )
+        self._written()
+        return True
+
+    def _evict(self, now: float) -> None:
+        cursor = self._conn.execute("DELETE FROM vt_cache WHERE expires_at <= ?", (now,))
+        self.evictions += max(0, cursor.rowcount)
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM vt_cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            cursor = self._conn.execute(
+                """
+                DELETE FROM vt_cache WHERE rowid IN (
+                    SELECT rowid FROM vt_cache ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+            self.evictions += max(0, cursor.rowcount)
+
+    def stats(self) -> Dict[str, int]:
+        (size,) = self._conn.execute("SELECT COUNT(*) FROM vt_cache").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": int(size),
+        }
+
+
+def not_found_payload(message: str) -> Dict[str, Any]:
+    """Тело ответа 404 в формате VT — если сервер вернул не JSON."""
+    return {"error": {"code": "NotFoundError", "message": message}}
+
+
+def is_not_found(payload: Dict[str, Any]) -> bool:
+    return "error" in payload